@@ -0,0 +1,89 @@
+import functools
+
+from device_controller.device import address_versions
+from device_controller.device.models import Device
+
+import hume_storage as storage
+
+
+"""
+This module provides pre-parsed timer action paths. An action path string,
+"uuid,action_id" or "uuid,device_id,action_id", is parsed once into an
+ActionPath which caches the device it points to. The cached device is only
+looked up again when the device's address version changes.
+"""
+
+
+class ActionPath:
+    """
+    A parsed action path, hashable and comparable by its components.
+    """
+
+    __slots__ = ("uuid", "device_id", "action_id", "_device", "_version")
+
+    def __init__(self, uuid, device_id, action_id):
+        """
+        :param uuid: device UUID
+        :param device_id: sub-device ID, None for the device itself
+        :param action_id: action ID
+        """
+        self.uuid = uuid
+        self.device_id = device_id
+        self.action_id = action_id
+
+        self._device = None
+        self._version = -1
+
+    @property
+    def device(self):
+        """
+        The device this action path points to, resolved from storage on
+        first use and whenever the device's address has changed.
+
+        :rtype: Device | None
+        """
+        version = address_versions.get(self.uuid)
+
+        if version != self._version:
+            self._device = storage.get(Device, self.uuid)
+            self._version = version
+
+        return self._device
+
+    def _key(self):
+        return self.uuid, self.device_id, self.action_id
+
+    def __eq__(self, other):
+        return isinstance(other, ActionPath) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __str__(self):
+        if self.device_id is None:
+            return f"{self.uuid},{self.action_id}"
+
+        return f"{self.uuid},{self.device_id},{self.action_id}"
+
+    def __repr__(self):
+        return f"<ActionPath {self}>"
+
+
+@functools.lru_cache(maxsize=65536)
+def parse(action_path):
+    """
+    Parses an action path string. Parsing the same string again returns the
+    same ActionPath object, sharing its cached device.
+
+    :param action_path: "uuid,action_id" or "uuid,device_id,action_id"
+    :type action_path: str
+    :rtype: ActionPath
+    """
+    split = action_path.split(',')
+
+    if len(split) == 3:
+        return ActionPath(split[0], int(split[1]), int(split[2]))
+    elif len(split) == 2:
+        return ActionPath(split[0], None, int(split[1]))
+
+    raise ValueError(f"malformed action path: {action_path}")
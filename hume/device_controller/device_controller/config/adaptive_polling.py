@@ -0,0 +1,103 @@
+import logging
+import threading
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module adapts the polling interval of timers reading sensor values. As
+long as readings stay within a deadband of the last significant reading the
+interval backs off towards the timer's max interval, and when readings change
+beyond it the interval tightens towards the min interval, the faster the
+change the more. Slowly changing values, such as indoor temperature, are then
+read far less often without missing meaningful changes.
+"""
+
+
+# Interval is multiplied by this for each reading within the deadband.
+BACKOFF = 1.5
+
+# A change of this many deadbands or more goes straight to the min interval.
+FAST_CHANGE = 4.0
+
+
+class AdaptiveInterval:
+    """
+    Effective polling interval of one timer, updated from its readings.
+    """
+
+    __slots__ = ("interval", "min_interval", "max_interval", "deadband",
+                 "_reference", "_lock")
+
+    def __init__(self, interval, min_interval, max_interval, deadband=0.0):
+        """
+        :param interval: initial interval in seconds
+        :param min_interval: shortest interval in seconds
+        :param max_interval: longest interval in seconds
+        :param deadband: largest change from the last significant reading
+                         that is not considered a change
+        """
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max(max_interval, min_interval))
+        self.interval = min(max(float(interval), self.min_interval),
+                            self.max_interval)
+        self.deadband = float(deadband or 0.0)
+
+        self._reference = None
+        self._lock = threading.Lock()
+
+    def update(self, result):
+        """
+        Adapts the interval to an action result. Results without a numeric
+        value, such as failed or non-read actions, leave it unchanged.
+
+        :param result: action result, {"value": ...} for read actions
+        """
+        value = reading(result)
+
+        if value is None:
+            return
+
+        with self._lock:
+            if self._reference is None:
+                self._reference = value
+                return
+
+            change = abs(value - self._reference)
+
+            if change <= self.deadband:
+                self.interval = min(self.interval * BACKOFF,
+                                    self.max_interval)
+                return
+
+            # Drift within the deadband adds up against the reference until
+            # it is significant.
+            self._reference = value
+
+            if self.deadband <= 0 or change >= FAST_CHANGE * self.deadband:
+                self.interval = self.min_interval
+            else:
+                self.interval = max(self.interval * self.deadband / change,
+                                    self.min_interval)
+
+    def next_delay(self):
+        """
+        :returns: seconds until the next reading
+        """
+        return self.interval
+
+
+def reading(result):
+    """
+    :param result: action result
+    :returns: numeric value of a read action result, None if there is none
+    :rtype: float | None
+    """
+    if not isinstance(result, dict):
+        return None
+
+    try:
+        return float(result["value"])
+    except (KeyError, TypeError, ValueError):
+        return None
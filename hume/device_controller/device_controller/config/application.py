@@ -1,19 +1,47 @@
 import logging
 
-from . import device_timer
-from .models import DeviceActionTimer
+from . import device_timer, action_path, schedule_engine, trigger_engine
+from .models import (
+    Timer,
+    Schedule,
+    Trigger,
+    DeviceActionTimer,
+    action_path_str
+)
 
 import hume_storage as storage
 
+from device_controller.device import device_req_handler
+from device_controller.device.models import Device
+from device_controller.util.args import (
+    get_arg,
+    TIMER_MISSED_POLICY,
+    TIMER_RESTART_POLICY,
+    TIMER_RESTART_WINDOW,
+    ACTION_CONCURRENCY,
+    ACTION_QUEUE_SIZE
+)
+
 
 LOGGER = logging.getLogger(__name__)
 
+# Timer fields that can be set in a timer configuration, the adaptive polling
+# fields and max_age are optional.
+TIMER_SETTINGS = ("interval",
+                  "min_interval",
+                  "max_interval",
+                  "deadband",
+                  "max_age")
+
 
 def model_init():
     """
     Initialize models.
     """
     LOGGER.info("model-init")
+    storage.register(Timer)
+    storage.register(Schedule)
+    storage.register(Trigger)
     storage.register(DeviceActionTimer)
 
 
@@ -23,6 +51,14 @@ def pre_start():
     """
     LOGGER.info("pre-start")
 
+    migrate_device_action_timers()
+
+    device_timer.configure(policy=get_arg(TIMER_MISSED_POLICY),
+                           restart_policy=get_arg(TIMER_RESTART_POLICY),
+                           restart_window=get_arg(TIMER_RESTART_WINDOW),
+                           action_concurrency=get_arg(ACTION_CONCURRENCY),
+                           action_queue_size=get_arg(ACTION_QUEUE_SIZE))
+
 
 def start():
     """
@@ -30,24 +66,111 @@ def start():
     """
     LOGGER.info("config start")
 
-    # TODO get all timers and start them
-    LOGGER.debug("getting all timers and starting them.")
-    timers = storage.get_all(DeviceActionTimer)
+    device_timer.start_scheduler()
 
-    for timer in timers:
-        LOGGER.debug(f"starting timer: {timer}")
-        device_timer.start(timer)
+    LOGGER.debug("getting all timers and restoring them.")
+    # Join to get each timer's device in the same query
+    device_timer.restore(Timer.select(Timer, Device).join(Device))
+
+    LOGGER.debug("getting all schedules and starting them.")
+    for schedule in Schedule.select(Schedule, Device).join(Device):
+        _start_schedule(schedule)
+
+    LOGGER.debug("getting all triggers and starting them.")
+    # Event and action devices are both joined, they are often different
+    action_device = Device.alias()
+    triggers = (Trigger
+                .select(Trigger, Device, action_device)
+                .join(Device, on=Trigger.device)
+                .switch(Trigger)
+                .join(action_device, on=Trigger.action_device))
+
+    for trigger in triggers:
+        trigger_engine.start(trigger)
+
+    LOGGER.info(f"started {trigger_engine.count()} triggers")
+
+    # Device events run the local triggers
+    device_req_handler.set_event_hook(device_event)
+
+    histogram = device_timer.load_histogram()
+    LOGGER.info(f"timer firings per second, peak: {max(histogram)} "
+                f"mean: {sum(histogram) / len(histogram):.1f}")
 
 
 def stop():
     """
-    Stop all running timers and schedules.
+    Stop all running timers, schedules and triggers.
     """
     LOGGER.info("config stop")
 
+    device_req_handler.set_event_hook(None)
+    trigger_engine.stop_all()
     device_timer.stop_all()
 
 
+def migrate_device_action_timers():
+    """
+    Moves timers from the legacy DeviceActionTimer model, keyed by action path
+    strings, to the Timer model.
+    """
+    legacy_timers = storage.get_all(DeviceActionTimer)
+
+    if not legacy_timers:
+        return
+
+    LOGGER.info(f"migrating {len(legacy_timers)} device action timers")
+
+    for legacy_timer in legacy_timers:
+        path = action_path.parse(legacy_timer.action)
+        device = storage.get(Device, path.uuid)
+
+        if device is None:
+            LOGGER.warning(f"dropping timer for unknown device: "
+                           f"{legacy_timer}")
+        elif _find_timer(device, path.device_id, path.action_id) is None:
+            storage.save(Timer(device=device,
+                               sub_device_id=path.device_id,
+                               action_id=path.action_id,
+                               interval=legacy_timer.interval))
+
+        storage.delete(legacy_timer)
+
+
+def _find_timer(device, device_id, action_id):
+    """
+    Indexed lookup of the timer for a device action.
+
+    :type device: Device
+    :param device_id: sub-device ID, None for the device itself
+    :param action_id: action ID
+    :rtype: Timer | None
+    """
+    if device_id is None:
+        sub_device = Timer.sub_device_id.is_null()
+    else:
+        sub_device = Timer.sub_device_id == device_id
+
+    return Timer.get_or_none((Timer.device == device) &
+                             sub_device &
+                             (Timer.action_id == action_id))
+
+
+def get_device_timers(uuid):
+    """
+    Get all timers of a device.
+
+    :param uuid: device UUID
+    :rtype: [Timer]
+    """
+    device = storage.get(Device, uuid)
+
+    if device is None:
+        return []
+
+    return list(Timer.select().where(Timer.device == device))
+
+
 # TODO re-do interface, split timer -> action_id, interval and add
 # TODO device_id=None as kwarg?
 def create_timer_configuration(uuid, timer):
@@ -55,37 +178,140 @@ def create_timer_configuration(uuid, timer):
     Interface for handling configuration changes.
 
     :param uuid: device ID
-    :param timer: new device timer
+    :param timer: new device timer, dict with action_id, interval and
+                  optionally device_id, the adaptive polling settings
+                  min_interval, max_interval and deadband, and max_age
     :return: timer reference
     """
     LOGGER.info(f"device: {uuid} new timer: {timer}")
 
+    device = storage.get(Device, uuid)
+
+    if device is None:
+        LOGGER.error(f"cannot create timer for unknown device: {uuid}")
+        return None
+
     device_id = timer.get("device_id")
-    # if sub-device
-    if device_id:
-        action_path = f"{uuid},{device_id},{timer['action_id']}"
-    else:
-        action_path = f"{uuid},{timer['action_id']}"
 
     # Check if timer already present for action path
-    device_action_timer = storage.get(DeviceActionTimer, action_path)
+    device_action_timer = _find_timer(device, device_id, timer["action_id"])
     LOGGER.debug(f"found timer object: {device_action_timer}")
 
     if device_action_timer:
         # Update interval if found
         LOGGER.debug("timer matched action path")
-        device_action_timer.interval = timer["interval"]
+        for field, value in _timer_settings(timer).items():
+            setattr(device_action_timer, field, value)
     else:
         # Not found, create a new timer
-        device_action_timer = DeviceActionTimer(interval=timer["interval"],
-                                                action=action_path)
+        device_action_timer = Timer(device=device,
+                                    sub_device_id=device_id,
+                                    action_id=timer["action_id"],
+                                    **_timer_settings(timer))
 
     storage.save(device_action_timer)
 
     # set timer
     device_timer.start(device_action_timer)
 
-    return action_path
+    return device_action_timer.action
+
+
+def apply_timer_configuration(timers, uuid=None):
+    """
+    Replaces the timers of a device, or of the whole home, with a complete
+    set of desired timers. Only the differences to the running timers are
+    applied, in one storage transaction and one timer scheduler update.
+
+    :param timers: desired timers, dicts with uuid, action_id, interval and
+                   optionally device_id, the adaptive polling settings
+                   and max_age, uuid may be left out if the uuid parameter
+                   is given
+    :param uuid: device to replace the timers of, None for all devices
+    :return: numbers of created, updated, deleted and unchanged timers
+    :rtype: dict
+    """
+    LOGGER.info(f"applying {len(timers)} timers to "
+                f"{'device: ' + uuid if uuid else 'all devices'}")
+
+    # Join to get each timer's device in the same query
+    query = Timer.select(Timer, Device).join(Device)
+    if uuid is not None:
+        query = query.where(Device.uuid == uuid)
+
+    running = {(timer.device.uuid, timer.sub_device_id, timer.action_id): timer
+               for timer in query}
+
+    desired = {}
+    for timer in timers:
+        timer_uuid = timer.get("uuid", uuid)
+
+        if uuid is not None and timer_uuid != uuid:
+            LOGGER.warning(f"ignoring timer of other device: {timer}")
+            continue
+
+        desired[(timer_uuid,
+                 timer.get("device_id"),
+                 timer["action_id"])] = _timer_settings(timer)
+
+    started = []
+    stopped = []
+    updated = 0
+
+    # Written with peewee inside the transaction, storage.save and
+    # storage.delete would update the storage cache even if the transaction
+    # is rolled back. Timers are not read from the cache. The scheduler is
+    # only updated once the transaction has been committed.
+    with Timer._meta.database.atomic():
+        for key, timer in running.items():
+            if key not in desired:
+                stopped.append(timer.action)
+                timer.delete_instance()
+
+        for key, settings in desired.items():
+            timer = running.get(key)
+
+            if timer is None:
+                device = storage.get(Device, key[0])
+
+                if device is None:
+                    LOGGER.error(f"cannot create timer for unknown device: "
+                                 f"{key[0]}")
+                    continue
+
+                timer = Timer(device=device,
+                              sub_device_id=key[1],
+                              action_id=key[2],
+                              **settings)
+            elif any(getattr(timer, field) != value
+                     for field, value in settings.items()):
+                for field, value in settings.items():
+                    setattr(timer, field, value)
+                updated += 1
+            else:
+                continue
+
+            timer.save()
+            started.append(timer)
+
+    device_timer.apply(start_timers=started, stop_refs=stopped)
+
+    result = {"created": len(started) - updated,
+              "updated": updated,
+              "deleted": len(stopped),
+              "unchanged": len(running) - updated - len(stopped)}
+    LOGGER.info(f"applied timers: {result}")
+
+    return result
+
+
+def _timer_settings(timer):
+    """
+    :param timer: timer configuration dict
+    :returns: Timer field values of the configuration
+    :rtype: dict
+    """
+    return {field: timer.get(field) for field in TIMER_SETTINGS}
 
 
 def delete_timer_configuration(uuid, timer):
@@ -98,7 +324,12 @@ def delete_timer_configuration(uuid, timer):
     """
     LOGGER.info(f"deleting timer with ref: {timer}")
 
-    timer_ref = storage.get(DeviceActionTimer, timer)
+    path = action_path.parse(timer)
+    device = storage.get(Device, path.uuid)
+
+    timer_ref = None
+    if device is not None:
+        timer_ref = _find_timer(device, path.device_id, path.action_id)
 
     if timer_ref is not None:
         device_timer.stop(timer_ref.action)
@@ -108,3 +339,177 @@ def delete_timer_configuration(uuid, timer):
         LOGGER.debug("timer did not exist, nothing is deleted")
 
     return timer_ref
+
+
+def _start_schedule(schedule):
+    """
+    Starts a schedule, logging instead of raising if its expression is
+    malformed.
+
+    :type schedule: Schedule
+    :returns: True if the schedule was started
+    """
+    try:
+        schedule_engine.start(schedule)
+    except ValueError as error:
+        LOGGER.error(f"invalid schedule: {schedule}: {error}")
+        return False
+
+    return True
+
+
+def create_schedule_configuration(uuid, schedule):
+    """
+    Interface for handling configuration changes.
+
+    :param uuid: device ID
+    :param schedule: new device schedule, dict with action_id, expression and
+                     optionally device_id
+    :return: schedule reference/None if the schedule is invalid
+    """
+    LOGGER.info(f"device: {uuid} new schedule: {schedule}")
+
+    device = storage.get(Device, uuid)
+
+    if device is None:
+        LOGGER.error(f"cannot create schedule for unknown device: {uuid}")
+        return None
+
+    try:
+        schedule_engine.compile_expression(schedule["expression"])
+    except ValueError as error:
+        LOGGER.error(f"invalid schedule expression: {error}")
+        return None
+
+    device_schedule = Schedule(device=device,
+                               sub_device_id=schedule.get("device_id"),
+                               action_id=schedule["action_id"],
+                               expression=schedule["expression"])
+    storage.save(device_schedule)
+
+    _start_schedule(device_schedule)
+
+    return device_schedule.id
+
+
+def delete_schedule_configuration(schedule_id):
+    """
+    Interface for handling configuration changes.
+
+    :param schedule_id: reference to existing schedule
+    :return: reference to deleted schedule/None
+    """
+    LOGGER.info(f"deleting schedule with ref: {schedule_id}")
+
+    schedule = Schedule.get_or_none(Schedule.id == schedule_id)
+
+    if schedule is None:
+        LOGGER.debug("schedule did not exist, nothing is deleted")
+        return None
+
+    schedule_engine.stop(schedule)
+    storage.delete(schedule)
+
+    return schedule_id
+
+
+def create_trigger_configuration(uuid, trigger):
+    """
+    Interface for handling configuration changes.
+
+    :param uuid: UUID of the device whose event triggers the action
+    :param trigger: new trigger, dict with event_id, action_uuid, action_id
+                    and optionally device_id and action_device_id
+    :return: trigger reference/None if a device is unknown
+    """
+    LOGGER.info(f"device: {uuid} new trigger: {trigger}")
+
+    device = storage.get(Device, uuid)
+    action_device = storage.get(Device, trigger["action_uuid"])
+
+    if device is None or action_device is None:
+        LOGGER.error(f"cannot create trigger for unknown device: {uuid} or "
+                     f"{trigger['action_uuid']}")
+        return None
+
+    device_trigger = Trigger(device=device,
+                             sub_device_id=trigger.get("device_id"),
+                             event_id=trigger["event_id"],
+                             action_device=action_device,
+                             action_sub_device_id=trigger.get(
+                                 "action_device_id"
+                             ),
+                             action_id=trigger["action_id"])
+    storage.save(device_trigger)
+
+    trigger_engine.start(device_trigger)
+
+    return device_trigger.id
+
+
+def delete_trigger_configuration(trigger_id):
+    """
+    Interface for handling configuration changes.
+
+    :param trigger_id: reference to existing trigger
+    :return: reference to deleted trigger/None
+    """
+    LOGGER.info(f"deleting trigger with ref: {trigger_id}")
+
+    trigger = Trigger.get_or_none(Trigger.id == trigger_id)
+
+    if trigger is None:
+        LOGGER.debug("trigger did not exist, nothing is deleted")
+        return None
+
+    trigger_engine.stop(trigger)
+    storage.delete(trigger)
+
+    return trigger_id
+
+
+def device_event(uuid, device_id, event_id):
+    """
+    Runs the local triggers of a device event.
+
+    :param uuid: UUID of the device the event occurred on
+    :param device_id: sub-device ID, None for the device itself
+    :param event_id: event ID
+    :return: number of triggered actions
+    """
+    return trigger_engine.event(uuid, device_id, event_id)
+
+
+def delete_device_configuration(uuid):
+    """
+    Deletes all timers, schedules and triggers of a device, for example when
+    it is detached.
+
+    :param uuid: device UUID
+    :return: number of deleted timers
+    """
+    LOGGER.info(f"deleting all configuration of device: {uuid}")
+
+    device = storage.get(Device, uuid)
+
+    if device is None:
+        return 0
+
+    timers = list(Timer.select().where(Timer.device == device))
+
+    for timer in timers:
+        device_timer.stop(action_path_str(uuid,
+                                          timer.sub_device_id,
+                                          timer.action_id))
+        storage.delete(timer)
+
+    for schedule in Schedule.select().where(Schedule.device == device):
+        schedule_engine.stop(schedule)
+        storage.delete(schedule)
+
+    for trigger in Trigger.select().where((Trigger.device == device) |
+                                          (Trigger.action_device == device)):
+        trigger_engine.stop(trigger)
+        storage.delete(trigger)
+
+    return len(timers)
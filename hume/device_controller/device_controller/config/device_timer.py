@@ -1,17 +1,217 @@
-import pprint
 import logging
 import threading
+import time
 
-from device_controller.config.models import DeviceActionTimer
-from device_controller.device import application as device_app
-from device_controller.device.models import Device
-
-import hume_storage as storage
+from device_controller.config import action_path
+from device_controller.config.adaptive_polling import AdaptiveInterval
+from device_controller.config.models import DeviceActionTimer, Timer
+from device_controller.config.scheduler import (
+    Scheduler,
+    POLICY_SKIP,
+    spread_delay
+)
+from device_controller.device.action_batcher import ActionBatcher
+from device_controller.device.action_executor import ActionExecutor
 
 
 LOGGER = logging.getLogger(__name__)
 
-_timers: {str: threading.Timer} = {}
+# All device action timers are driven by this scheduler's single thread, keyed
+# by their action path.
+_scheduler = Scheduler(name="device-timer", policy=POLICY_SKIP)
+
+# Device requests for timer actions are sent on a bounded pool, one at a time
+# per device, instead of on the scheduler's workers.
+_executor = ActionExecutor()
+
+# Timer actions firing close together on the same device are sent to the
+# device in one batched request.
+_batcher = ActionBatcher(_scheduler, _executor)
+
+# Spread the phases of timers with the same interval over the interval, by
+# device UUID hash, instead of arming them all to fire at the same instant.
+# Timers on the same device share their phase so that their actions can be
+# batched.
+_spread_phases = True
+
+# Restart policies, what to do about timer firings missed while stopped.
+# Either way, restored timers keep the phase of their persisted next firing.
+RESTART_RESUME = "resume"  # Fire missed firings once, immediately
+RESTART_SKIP = "skip"  # Drop missed firings
+RESTART_SPREAD = "spread"  # Fire missed firings once, spread over a window
+
+RESTART_POLICIES = [RESTART_SPREAD, RESTART_RESUME, RESTART_SKIP]
+
+DEFAULT_RESTART_WINDOW = 60.0
+
+_restart_policy = RESTART_SPREAD
+_restart_window = DEFAULT_RESTART_WINDOW
+
+# Fire times are kept in memory when timers fire and written to storage in
+# one transaction this often, instead of writing on every firing.
+PERSIST_INTERVAL = 60.0
+
+# Timer ID: (wall clock time it last fired, wall clock time it was due),
+# since the last persist
+_fired = {}
+_fired_lock = threading.Lock()
+
+# Action paths of timer actions handed to the batcher and not completed yet.
+# A timer firing while its previous action is still in flight is skipped, the
+# scheduler's own skip only covers the hand-off, which returns immediately.
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+_skipped_in_flight = 0
+
+
+def configure(policy=None,
+              spread_phases=None,
+              restart_policy=None,
+              restart_window=None,
+              action_concurrency=None,
+              action_queue_size=None):
+    """
+    :param policy: what to do about missed firings when the timers fall
+                   behind, one of scheduler.POLICIES, None keeps the default
+    :param spread_phases: spread timer phases over their interval, None
+                          keeps the default
+    :param restart_policy: what to do about firings missed while stopped,
+                           one of RESTART_POLICIES, None keeps the default
+    :param restart_window: seconds to spread missed firings over with
+                           RESTART_SPREAD, None keeps the default
+    :param action_concurrency: max number of devices sent action requests
+                               at once, None keeps the default
+    :param action_queue_size: max number of queued action requests, None
+                              keeps the default
+    """
+    global _spread_phases, _restart_policy, _restart_window
+
+    if policy:
+        LOGGER.debug(f"timer missed firing policy: {policy}")
+        _scheduler.policy = policy
+
+    if spread_phases is not None:
+        _spread_phases = spread_phases
+
+    if restart_policy:
+        LOGGER.debug(f"timer restart policy: {restart_policy}")
+        _restart_policy = restart_policy
+
+    if restart_window is not None:
+        _restart_window = restart_window
+
+    # Takes effect when the executor is started
+    if action_concurrency:
+        _executor.concurrency = action_concurrency
+
+    if action_queue_size:
+        _executor.queue_size = action_queue_size
+
+
+def start_scheduler():
+    """
+    Starts the timer scheduler, which also executes triggered actions, before
+    any timer is started.
+    """
+    _executor.start()
+    _scheduler.start()
+    _scheduler.schedule(("persist",),
+                        PERSIST_INTERVAL,
+                        persist_fire_times,
+                        interval=PERSIST_INTERVAL)
+
+
+def restore(timers, now=None):
+    """
+    Starts stored timers after a restart in one scheduler update. Each timer
+    continues in the phase of its persisted next firing, and firings missed
+    while stopped are handled according to the restart policy. Timers that
+    have never fired are started as new.
+
+    :param timers: timers to start
+    :type timers: [Timer]
+    :param now: current wall clock time, for testing
+    :returns: number of missed firings that will be caught up
+    """
+    now = time.time() if now is None else now
+
+    arms = []
+    catch_ups = 0
+
+    for timer in timers:
+        key, delay, callback, args, interval, next_delay = _timer_args(timer)
+
+        if timer.next_fire is not None:
+            delay, catch_up = restart_delays(key,
+                                             interval,
+                                             timer.next_fire,
+                                             now)
+
+            if catch_up is not None:
+                arms.append((_catch_up_key(key), catch_up, callback, args,
+                             None, None))
+                catch_ups += 1
+
+        arms.append((key, delay, callback, args, interval, next_delay))
+
+    _scheduler.update(timers=arms)
+
+    LOGGER.info(f"restored {len(arms) - catch_ups} timers, catching up "
+                f"{catch_ups} missed firings ({_restart_policy})")
+
+    return catch_ups
+
+
+def restart_delays(key, interval, next_fire, now):
+    """
+    :param key: timer reference
+    :param interval: timer interval in seconds
+    :param next_fire: persisted wall clock time of the timer's next firing
+    :param now: current wall clock time
+    :returns: seconds until the timer's next firing in phase, and seconds
+              until a single catch-up firing for missed firings or None
+    :rtype: (float, float | None)
+    """
+    # Also brings next_fire back into range if the interval was shortened
+    delay = (next_fire - now) % interval or interval
+
+    if next_fire > now or _restart_policy == RESTART_SKIP:
+        return delay, None
+
+    if _restart_policy == RESTART_RESUME:
+        catch_up = 0.0
+    else:
+        catch_up = spread_delay(key, _restart_window, now)
+
+    # The next firing in phase catches up by itself if it comes first
+    if catch_up >= delay:
+        return delay, None
+
+    return delay, catch_up
+
+
+def persist_fire_times():
+    """
+    Writes the fire times recorded since the last call to storage, in one
+    transaction. The next firing is computed from when the timer was due, so
+    that a timer lagging behind keeps its phase across restarts.
+    """
+    global _fired
+
+    with _fired_lock:
+        fired, _fired = _fired, {}
+
+    if not fired:
+        return
+
+    with Timer._meta.database.atomic():
+        for timer_id, (fired_at, due) in fired.items():
+            (Timer
+             .update(last_fired=fired_at, next_fire=due + Timer.interval)
+             .where(Timer.id == timer_id)
+             .execute())
+
+    LOGGER.debug(f"persisted fire times of {len(fired)} timers")
 
 
 def start(device_action_timer: DeviceActionTimer):
@@ -23,23 +223,94 @@ def start(device_action_timer: DeviceActionTimer):
     """
     LOGGER.debug(f"starting timer: {device_action_timer}")
 
-    try:
-        active_timer = _timers.pop(device_action_timer.action)
-        active_timer.cancel()
+    _scheduler.start()
+
+    key, delay, callback, args, interval, next_delay = \
+        _timer_args(device_action_timer)
+    _scheduler.schedule(key,
+                        delay,
+                        callback,
+                        *args,
+                        interval=interval,
+                        next_delay=next_delay)
 
-        LOGGER.debug(f"there was already an old timer, cancelling: "
-                     f"{active_timer}")
-    except KeyError:
-        # This is the case if no timer existed before.
-        pass
+    LOGGER.debug(f"number of active timers: {len(_scheduler)}")
 
-    new_timer = threading.Timer(float(device_action_timer.interval),
-                                timeout,
-                                args=(device_action_timer,))
-    _timers[device_action_timer.action] = new_timer
-    new_timer.start()
 
-    LOGGER.debug(f"new _timers: {pprint.pformat(_timers, indent=2)}")
+def apply(start_timers=(), stop_refs=()):
+    """
+    Starts and stops many timers in one scheduler update.
+
+    :param start_timers: timers to start, replacing running timers with the
+                         same device action
+    :param stop_refs: action paths of timers to stop
+    """
+    _scheduler.start()
+
+    _scheduler.update(timers=[_timer_args(timer) for timer in start_timers],
+                      cancel=[key for ref in stop_refs
+                              for key in (ref, _catch_up_key(ref))])
+
+    LOGGER.debug(f"number of active timers: {len(_scheduler)}")
+
+
+def _timer_args(device_action_timer):
+    """
+    :returns: (key, delay, callback, args, interval, next_delay) to arm a
+              timer with
+    """
+    interval = float(device_action_timer.interval)
+    # Parsed once here instead of on every timeout
+    path = action_path.parse(device_action_timer.action)
+
+    adaptive = None
+    next_delay = None
+
+    if device_action_timer.adaptive:
+        adaptive = AdaptiveInterval(interval,
+                                    device_action_timer.min_interval,
+                                    device_action_timer.max_interval,
+                                    device_action_timer.deadband)
+        interval = adaptive.interval
+        next_delay = adaptive.next_delay
+
+    if _spread_phases:
+        delay = spread_delay(path.uuid, interval)
+    else:
+        delay = interval
+
+    return (device_action_timer.action,
+            delay,
+            timeout,
+            (path,
+             device_action_timer.id,
+             adaptive,
+             device_action_timer.max_age),
+            interval,
+            next_delay)
+
+
+def _catch_up_key(timer_ref):
+    """
+    :returns: key of the one-shot firing catching up a timer after restart
+    """
+    return "catch_up", timer_ref
+
+
+def start_recurring(ref, path, delay, next_delay):
+    """
+    Sets up a timer firing at irregular times, such as a calendar schedule,
+    replacing any timer with the same reference.
+
+    :param ref: timer reference, must not collide with action paths
+    :param path: action path of the action to execute
+    :type path: action_path.ActionPath
+    :param delay: seconds until the first firing
+    :param next_delay: called each time the timer fires, returns the seconds
+                       until the next firing or None to stop
+    """
+    _scheduler.start()
+    _scheduler.schedule(ref, delay, timeout, path, next_delay=next_delay)
 
 
 def stop_all():
@@ -47,8 +318,14 @@ def stop_all():
     Stop all running timers.
     """
     LOGGER.debug("stopping all device timers")
-    for timer in _timers.values():
-        timer.cancel()
+    _scheduler.stop()
+    _batcher.stop()
+    _executor.stop()
+    persist_fire_times()
+
+    # Actions dropped by the executor never complete
+    with _in_flight_lock:
+        _in_flight.clear()
 
 
 def stop(timer_ref):
@@ -58,32 +335,143 @@ def stop(timer_ref):
     :param timer_ref:
     """
     LOGGER.debug(f"stopping device timer: {timer_ref}")
-    _timers.pop(timer_ref).cancel()
+    _scheduler.cancel(timer_ref)
+    _scheduler.cancel(_catch_up_key(timer_ref))
 
 
-def timeout(device_action_timer):
+def lag_stats(timer_ref):
     """
-    Restarts the timer that timed out.
+    Firing lag statistics of a timer, how long after its deadline its action
+    was handed to the batcher. Time spent waiting for the batch window, the
+    executor queue and the device is not included.
 
-    :param device_action_timer:
-    :return:
+    :param timer_ref: timer action path
+    :returns: dict with last, max and p99 lag in seconds, None if the timer is
+              not running
+    :rtype: dict | None
+    """
+    return _scheduler.lag_stats(timer_ref)
+
+
+def interval_stats():
+    """
+    Effective intervals of adaptive polling timers.
+
+    :returns: dict with number of timers and their min, mean and max
+              effective interval in seconds
+    :rtype: dict
+    """
+    return _scheduler.interval_stats()
+
+
+def load_histogram(window=60):
+    """
+    Number of timer firings due in each second of the next window seconds.
+
+    :param window: number of seconds to look ahead
+    :rtype: [int]
+    """
+    return _scheduler.load_histogram(window)
+
+
+def batch_stats():
+    """
+    :returns: number of timer actions executed, of device requests used and
+              of timer firings skipped because the previous action of the
+              timer was still in flight
+    :rtype: dict
+    """
+    return {**_batcher.stats(), "skipped_in_flight": _skipped_in_flight}
+
+
+def executor_stats():
+    """
+    :returns: device action queue depth, wait times and rejected actions
+    :rtype: dict
+    """
+    return _executor.stats()
+
+
+def timeout(path, timer_id=None, adaptive=None, max_age=None):
+    """
+    Executes the action of the timer that timed out. Called on a scheduler
+    worker thread, the scheduler re-arms the timer. The firing is skipped if
+    the timer's previous action has not completed yet.
+
+    :param path: action path of the timer
+    :type path: action_path.ActionPath
+    :param timer_id: ID of the timer to record the fire time of, None for
+                     timers without persisted fire times
+    :param adaptive: interval of an adaptive polling timer, updated with the
+                     action result
+    :type adaptive: AdaptiveInterval | None
+    :param max_age: seconds old a cached reading may be to answer the firing
+                    without a device request, None to always read
+    """
+    global _skipped_in_flight
+
+    LOGGER.debug(f"timer timed out: {path}")
+
+    if timer_id is not None:
+        fired_at = time.time()
+
+        with _fired_lock:
+            _fired[timer_id] = fired_at, _scheduler.due() or fired_at
+
+    with _in_flight_lock:
+        if path in _in_flight:
+            LOGGER.debug(f"timer action still in flight, skipping: {path}")
+            _skipped_in_flight += 1
+            return
+
+        _in_flight.add(path)
+
+    def completed(result):
+        """
+        :param result: action result, None if the action failed
+        """
+        with _in_flight_lock:
+            _in_flight.discard(path)
+
+        if adaptive is not None:
+            adaptive.update(result)
+
+    if not execute(path, completed, max_age=max_age):
+        with _in_flight_lock:
+            _in_flight.discard(path)
+
+
+def execute(path, on_result=None, max_age=None):
+    """
+    Executes a device action, batched with other actions on the same device.
+
+    :param path: action path of the action
+    :type path: action_path.ActionPath
+    :param on_result: called with the action result, None if it failed
+    :param max_age: seconds old a cached read result may be, None to always
+                    send the action
+    :returns: False if the device does not exist, on_result is then not
+              called
     """
-    LOGGER.debug(f"timer timed out: {device_action_timer}")
+    device = path.device
 
-    timer = threading.Timer(float(device_action_timer.interval),
-                            timeout,
-                            args=(device_action_timer,))
-    _timers.update({device_action_timer.action: timer})
+    if device is None:
+        LOGGER.warning(f"action device does not exist: {path.uuid}")
+        return False
 
-    split = device_action_timer.action.split(',')
+    def action_result(result):
+        """
+        :param result: action result, None if the action failed
+        """
+        LOGGER.debug(f"action {path} result: {result}")
 
-    uuid = split[0]
-    device = storage.get(Device, uuid)
-    LOGGER.debug(f"timer timeout found device: {device}")
+        if on_result is not None:
+            on_result(result)
 
-    if len(split) == 3:
-        device_app.sub_device_action(device, int(split[1]), int(split[2]))
-    elif len(split) == 2:
-        device_app.device_action(device, int(split[1]))
+    _batcher.submit(device,
+                    path.device_id,
+                    path.action_id,
+                    action_result,
+                    max_age=max_age)
 
-    timer.start()
+    return True
@@ -2,15 +2,195 @@ import peewee
 
 from hume_storage import PersistentModel
 
+from device_controller.device.models import Device
+
 
 # TODO How can we make guards work? It's nice to guard some actions from being
 # TODO executed automatically, perhaps from a config interval timing out.
 # TODO Have to evaluate usability and have a clear use-case before implementing
 # TODO because it will become quite tricky, and should not be done for nothing.
 
-# TODO split this up into timers, schedules, and triggers. Keeping
-# TODO everything in the same model is very poorly normalized.
+# Timers, schedules, and triggers each have their own model, keyed by integer
+# IDs and referring to their device by foreign key. The sub-device and action
+# of a configuration are kept in separate columns and indexed together with
+# the device, so that all configurations of a device can be found, and
+# deleted, without string matching.
+#
+# These models are always read with peewee queries, never with storage.get,
+# since rows loaded by a query at start are not in the storage cache. They
+# are written with storage.save and storage.delete, which write through to
+# the database.
+
+
+class Timer(PersistentModel):
+    """
+    Executes a device action periodically.
+    """
+
+    device = peewee.ForeignKeyField(Device,
+                                    backref="timers",
+                                    on_delete="CASCADE")
+    sub_device_id = peewee.IntegerField(null=True)  # None = device itself
+    action_id = peewee.IntegerField()
+
+    interval = peewee.IntegerField()
+
+    # Adaptive polling, the interval adapts between these bounds to how fast
+    # the action's readings change beyond the deadband, see
+    # config.adaptive_polling. Fixed interval if not set.
+    min_interval = peewee.IntegerField(null=True)
+    max_interval = peewee.IntegerField(null=True)
+    deadband = peewee.FloatField(null=True)
+
+    # Seconds old a cached reading of the action may be to answer a firing
+    # without a device request, see device.single_flight. Always read from
+    # the device if not set.
+    max_age = peewee.FloatField(null=True)
+
+    # Wall clock times, persisted periodically to resume the timer's phase
+    # after a restart, see config.device_timer.persist_fire_times.
+    last_fired = peewee.FloatField(null=True)
+    next_fire = peewee.FloatField(null=True)
+
+    class Meta:
+        indexes = (
+            (("device", "sub_device_id", "action_id"), True),
+        )
+
+    @staticmethod
+    def local_key_field():
+        """
+        :return: name of local dict key field
+        """
+        return "id"
+
+    @property
+    def action(self):
+        """
+        :return: action path string, "uuid,action_id" or
+                 "uuid,device_id,action_id"
+        """
+        return action_path_str(self.device.uuid,
+                               self.sub_device_id,
+                               self.action_id)
+
+    @property
+    def adaptive(self):
+        """
+        :return: True if the timer's interval adapts to its readings
+        """
+        return self.min_interval is not None and self.max_interval is not None
+
+    def __str__(self):
+        return f"{self.__class__} action: {self.action} " \
+               f"interval: {self.interval}"
+
+
+# NULLs are distinct in unique indexes, so the index above does not keep a
+# device itself from getting two timers for the same action.
+Timer.add_index(Timer.index(Timer.device, Timer.action_id, unique=True)
+                .where(peewee.SQL("sub_device_id IS NULL")))
+
+
+class Schedule(PersistentModel):
+    """
+    Executes a device action at calendar times.
+    """
+
+    device = peewee.ForeignKeyField(Device,
+                                    backref="schedules",
+                                    on_delete="CASCADE")
+    sub_device_id = peewee.IntegerField(null=True)  # None = device itself
+    action_id = peewee.IntegerField()
+
+    expression = peewee.CharField()  # cron expression
+
+    class Meta:
+        indexes = (
+            (("device", "sub_device_id", "action_id"), False),
+        )
+
+    @staticmethod
+    def local_key_field():
+        """
+        :return: name of local dict key field
+        """
+        return "id"
+
+    @property
+    def action(self):
+        """
+        :return: action path string, "uuid,action_id" or
+                 "uuid,device_id,action_id"
+        """
+        return action_path_str(self.device.uuid,
+                               self.sub_device_id,
+                               self.action_id)
+
+    def __str__(self):
+        return f"{self.__class__} action: {self.action} " \
+               f"expression: {self.expression}"
+
+
+class Trigger(PersistentModel):
+    """
+    Executes a device action when a device event occurs.
+    """
+
+    # Event source
+    device = peewee.ForeignKeyField(Device,
+                                    backref="triggers",
+                                    on_delete="CASCADE")
+    sub_device_id = peewee.IntegerField(null=True)  # None = device itself
+    event_id = peewee.IntegerField()
+
+    # Action target
+    action_device = peewee.ForeignKeyField(Device,
+                                           backref="triggered_by",
+                                           on_delete="CASCADE")
+    action_sub_device_id = peewee.IntegerField(null=True)
+    action_id = peewee.IntegerField()
+
+    class Meta:
+        indexes = (
+            (("device", "sub_device_id", "event_id"), False),
+        )
+
+    @staticmethod
+    def local_key_field():
+        """
+        :return: name of local dict key field
+        """
+        return "id"
+
+    @property
+    def event(self):
+        """
+        :return: (uuid, device_id, event_id) of the triggering event
+        """
+        return self.device.uuid, self.sub_device_id, self.event_id
+
+    @property
+    def action(self):
+        """
+        :return: action path string of the triggered action
+        """
+        return action_path_str(self.action_device.uuid,
+                               self.action_sub_device_id,
+                               self.action_id)
+
+    def __str__(self):
+        return f"{self.__class__} event: {self.event} " \
+               f"action: {self.action}"
+
+
+# TODO remove once all HUMEs have migrated their timers, see
+# TODO config.application.migrate_device_action_timers.
 class DeviceActionTimer(PersistentModel):
+    """
+    Legacy timer model keyed by action path string, only kept to migrate
+    existing timers to the Timer model.
+    """
 
     interval = peewee.IntegerField()
     action = peewee.CharField(unique=True)
@@ -25,3 +205,16 @@ class DeviceActionTimer(PersistentModel):
     def __str__(self):
         return f"{self.__class__} action: {self.action} " \
                f"interval: {self.interval}"
+
+
+def action_path_str(uuid, device_id, action_id):
+    """
+    :param uuid: device UUID
+    :param device_id: sub-device ID, None for the device itself
+    :param action_id: action ID
+    :return: action path string
+    """
+    if device_id is None:
+        return f"{uuid},{action_id}"
+
+    return f"{uuid},{device_id},{action_id}"
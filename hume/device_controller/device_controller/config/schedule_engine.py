@@ -0,0 +1,242 @@
+import bisect
+import datetime
+import functools
+import logging
+
+from device_controller.config import action_path, device_timer
+from device_controller.config.models import Schedule
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module runs device actions at calendar times given by cron-style
+expressions, for example "30 7 * * mon-fri" for 07:30 on weekdays.
+
+Each expression is compiled once into the sorted minutes of the day it fires
+at and the days it fires on. Finding the next firing is then a bisection of
+the minutes left today, only walking forward day by day when nothing is left.
+Schedules are armed on the device timer scheduler, which keeps them in its
+min-heap by next firing time, so idle schedules cost nothing between firings.
+"""
+
+
+# Expression shorthands
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+MONTH_NAMES = ("jan", "feb", "mar", "apr", "may", "jun",
+               "jul", "aug", "sep", "oct", "nov", "dec")
+WEEKDAY_NAMES = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+
+# Longest gap between two firings of a valid expression is a leap day, eight
+# years covers skipped leap years such as 2100.
+_MAX_DAYS = 366 * 8
+
+
+class CronExpression:
+    """
+    Compiled five field cron expression: minute, hour, day of month, month
+    and day of week. Fields support "*", values, names, lists, ranges and
+    steps. As in cron, a day matches if either the day of month or the day of
+    week matches when both are restricted.
+    """
+
+    __slots__ = ("expression", "minutes", "days_of_month", "months",
+                 "weekdays", "_any_day_of_month", "_any_weekday")
+
+    def __init__(self, expression):
+        """
+        :param expression: cron expression string
+        :raises ValueError: if the expression is malformed
+        """
+        self.expression = expression
+
+        fields = MACROS.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"expected 5 cron fields: {expression}")
+
+        minute, hour, day_of_month, month, weekday = fields
+
+        # Sorted minutes of the day, bisected to find the next firing
+        self.minutes = tuple(h * 60 + m
+                             for h in sorted(_parse_field(hour, 0, 23))
+                             for m in sorted(_parse_field(minute, 0, 59)))
+        self.days_of_month = _parse_field(day_of_month, 1, 31)
+        self.months = _parse_field(month, 1, 12, MONTH_NAMES)
+        # 7 is also Sunday
+        self.weekdays = frozenset(day % 7 for day in
+                                  _parse_field(weekday, 0, 7, WEEKDAY_NAMES))
+
+        self._any_day_of_month = day_of_month.startswith("*")
+        self._any_weekday = weekday.startswith("*")
+
+    def matches_day(self, date):
+        """
+        :type date: datetime.date
+        :returns: True if the expression fires on this date
+        """
+        if date.month not in self.months:
+            return False
+
+        day_of_month = date.day in self.days_of_month
+        # date.weekday() is 0 for Monday, cron uses 0 for Sunday
+        weekday = (date.weekday() + 1) % 7 in self.weekdays
+
+        if self._any_day_of_month:
+            return weekday
+        if self._any_weekday:
+            return day_of_month
+
+        return day_of_month or weekday
+
+    def next_after(self, when):
+        """
+        :param when: time to look for the next firing after
+        :type when: datetime.datetime
+        :returns: the first firing strictly after when, None if the
+                  expression never fires, e.g. on February 30th
+        :rtype: datetime.datetime | None
+        """
+        start = when.replace(second=0, microsecond=0) + \
+            datetime.timedelta(minutes=1)
+        date = start.date()
+        minute_of_day = start.hour * 60 + start.minute
+
+        for _ in range(_MAX_DAYS):
+            if self.matches_day(date):
+                index = bisect.bisect_left(self.minutes, minute_of_day)
+
+                if index < len(self.minutes):
+                    hour, minute = divmod(self.minutes[index], 60)
+                    return datetime.datetime.combine(
+                        date, datetime.time(hour, minute), when.tzinfo
+                    )
+
+            date += datetime.timedelta(days=1)
+            minute_of_day = 0
+
+        return None
+
+    def __str__(self):
+        return self.expression
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_expression(expression):
+    """
+    Compiles a cron expression, each distinct expression is only compiled
+    once.
+
+    :param expression: cron expression string
+    :rtype: CronExpression
+    :raises ValueError: if the expression is malformed
+    """
+    return CronExpression(expression)
+
+
+def _parse_field(field, low, high, names=()):
+    """
+    :param field: one field of a cron expression
+    :param low: lowest allowed value
+    :param high: highest allowed value
+    :param names: value names, the first name has value low
+    :returns: values the field matches
+    :rtype: frozenset
+    :raises ValueError: if the field is malformed
+    """
+    def value(token):
+        token = token.lower()
+        if token in names:
+            return names.index(token) + low
+
+        number = int(token)
+        if not low <= number <= high:
+            raise ValueError(f"{number} not in range {low}-{high}")
+
+        return number
+
+    values = set()
+
+    for part in field.split(","):
+        span, _, step = part.partition("/")
+        step = int(step) if step else 1
+
+        if step < 1:
+            raise ValueError(f"invalid step: {part}")
+
+        if span == "*":
+            first, last = low, high
+        elif "-" in span:
+            first, last = (value(token) for token in span.split("-", 1))
+        else:
+            first = value(span)
+            last = high if step > 1 else first
+
+        values.update(range(first, last + 1, step))
+
+    return frozenset(values)
+
+
+def schedule_ref(schedule: Schedule):
+    """
+    :returns: scheduler key of a schedule, kept apart from timer keys
+    """
+    return "schedule", schedule.id
+
+
+def start(schedule: Schedule):
+    """
+    Arms a schedule for its next firing, replacing it if already running.
+
+    :param schedule: schedule with its device loaded
+    :raises ValueError: if the schedule expression is malformed
+    """
+    expression = compile_expression(schedule.expression)
+    path = action_path.parse(schedule.action)
+
+    now = datetime.datetime.now()
+    next_fire = expression.next_after(now)
+
+    if next_fire is None:
+        LOGGER.warning(f"schedule never fires: {schedule}")
+        return
+
+    def next_delay():
+        """
+        Called by the scheduler each time the schedule fires. Looks from the
+        firing that was due, not only from now, so that a firing a little
+        early by the wall clock does not fire the same minute twice.
+        """
+        nonlocal next_fire
+        now = datetime.datetime.now()
+        next_fire = expression.next_after(max(now, next_fire))
+
+        if next_fire is None:
+            return None
+
+        return max((next_fire - now).total_seconds(), 0.0)
+
+    delay = max((next_fire - now).total_seconds(), 0.0)
+
+    LOGGER.debug(f"starting schedule: {schedule} next at {next_fire}")
+    device_timer.start_recurring(schedule_ref(schedule),
+                                 path,
+                                 delay,
+                                 next_delay)
+
+
+def stop(schedule: Schedule):
+    """
+    Stops a running schedule.
+    """
+    LOGGER.debug(f"stopping schedule: {schedule}")
+    device_timer.stop(schedule_ref(schedule))
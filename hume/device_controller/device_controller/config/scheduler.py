@@ -0,0 +1,526 @@
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module implements a timer scheduler where a single thread drives any
+number of timers kept in a min-heap by deadline. Fired timer callbacks are
+handed to a bounded pool of worker threads so that a slow callback does not
+delay other timers.
+
+Starting, stopping and re-arming a timer is O(log n). Stopped timers are
+marked as cancelled and discarded when they reach the top of the heap.
+
+Periodic timers run at a fixed rate against the monotonic clock, the next
+deadline is computed from the previous deadline and not from when the timer
+fired, so slow callbacks do not shift the schedule. If a timer falls a whole
+interval or more behind, or its previous firing is still waiting for or
+running on a worker, its missed firings are either all fired
+(POLICY_CATCH_UP) or skipped to the next deadline in phase (POLICY_SKIP).
+
+Timers with irregular periods, such as calendar schedules or adaptive
+polling, are armed with a next_delay function. It is called each time the
+timer fires to get the delay until the next firing. Timers armed with both
+an interval and a next_delay function, adaptive polling, keep the last delay
+as their effective interval. Timers with only a next_delay function, such as
+calendar schedules, have no interval.
+"""
+
+
+DEFAULT_WORKERS = 8
+
+# Missed firing policies for periodic timers.
+POLICY_CATCH_UP = "catch_up"
+POLICY_SKIP = "skip"
+
+POLICIES = [POLICY_SKIP, POLICY_CATCH_UP]
+
+# Number of recent firing lags kept per timer for percentiles.
+LAG_SAMPLES = 128
+
+# The heap is rebuilt without cancelled timers when they make up more than
+# half of it, and there are at least this many.
+_COMPACT_THRESHOLD = 512
+
+
+def spread_delay(key, interval, now=None):
+    """
+    Returns the delay until a periodic timer's first firing so that timers
+    with the same interval are spread evenly over the interval instead of all
+    firing at once. The phase is derived from a stable hash of the key and
+    is relative to wall clock time, so a timer keeps its phase across
+    re-arms and restarts.
+
+    :param key: timer reference, its string form is hashed
+    :param interval: timer interval in seconds
+    :param now: current wall clock time, for testing
+    :returns: seconds until the first firing, in (0, interval]
+    """
+    if now is None:
+        now = time.time()
+
+    phase = zlib.crc32(str(key).encode('utf-8')) / 2 ** 32 * interval
+    delay = (phase - now) % interval
+
+    return delay or interval
+
+
+class LagStats:
+    """
+    Firing lag of a timer, the time from when it was due until its callback
+    started executing. Growing lag means the scheduler is saturated.
+    """
+
+    __slots__ = ("last", "max", "count", "skipped", "_samples")
+
+    def __init__(self):
+        self.last = 0.0
+        self.max = 0.0
+        self.count = 0
+        self.skipped = 0
+        self._samples = collections.deque(maxlen=LAG_SAMPLES)
+
+    def record(self, lag):
+        """
+        :param lag: seconds the callback started after its deadline
+        """
+        self.last = lag
+        self.count += 1
+        self._samples.append(lag)
+
+        if lag > self.max:
+            self.max = lag
+
+    @property
+    def p99(self):
+        """
+        99th percentile of the recent lag samples.
+        """
+        samples = sorted(self._samples)
+
+        if not samples:
+            return 0.0
+
+        return samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+    def as_dict(self):
+        """
+        :rtype: dict
+        """
+        return {"last": self.last,
+                "max": self.max,
+                "p99": self.p99,
+                "count": self.count,
+                "skipped": self.skipped}
+
+
+class _Entry:
+    """
+    A timer in the scheduler heap.
+    """
+
+    __slots__ = ("deadline", "seq", "key", "interval", "next_delay",
+                 "effective", "callback", "args", "policy", "lag", "pending",
+                 "cancelled")
+
+    def __init__(self,
+                 deadline,
+                 seq,
+                 key,
+                 interval,
+                 next_delay,
+                 callback,
+                 args,
+                 policy):
+        self.deadline = deadline
+        self.seq = seq
+        self.key = key
+        self.interval = interval
+        self.next_delay = next_delay
+        # Last delay returned by next_delay, for timers with an interval
+        self.effective = interval
+        self.callback = callback
+        self.args = args
+        self.policy = policy
+        self.lag = LagStats()
+        self.pending = False
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class Scheduler:
+    """
+    Drives keyed one-shot and periodic timers from a single thread.
+    """
+
+    def __init__(self,
+                 workers=DEFAULT_WORKERS,
+                 name="scheduler",
+                 policy=POLICY_SKIP):
+        """
+        :param workers: number of threads executing fired callbacks
+        :param name: name of the scheduler thread
+        :param policy: default missed firing policy for periodic timers
+        """
+        self.workers = workers
+        self.name = name
+        self.policy = policy
+
+        self._heap = []
+        self._cancelled = 0
+        self._entries = {}
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+
+        self._thread = None
+        self._executor = None
+        self._running = False
+        # Deadline of the callback running on the current worker thread
+        self._local = threading.local()
+
+    def start(self):
+        """
+        Starts the scheduler thread, does nothing if already started.
+        """
+        with self._condition:
+            if self._running:
+                return
+
+            self._running = True
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix=f"{self.name}-worker"
+            )
+            self._thread = threading.Thread(target=self._run,
+                                            name=self.name,
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Cancels all timers, stops the scheduler thread and waits for running
+        callbacks to finish.
+        """
+        with self._condition:
+            if not self._running:
+                return
+
+            self._running = False
+            self._cancel_all()
+            self._condition.notify()
+
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def schedule(self,
+                 key,
+                 delay,
+                 callback,
+                 *args,
+                 interval=None,
+                 policy=None,
+                 next_delay=None):
+        """
+        Arms a timer, replacing any timer with the same key.
+
+        :param key: hashable timer reference
+        :param delay: seconds until the timer fires the first time
+        :param callback: called with args on a worker thread when fired
+        :param interval: if set, the timer is re-armed with this many seconds
+                         each time it fires, with next_delay its nominal
+                         interval
+        :param policy: missed firing policy, defaults to the scheduler's
+        :param next_delay: if set, called each time the timer fires to get
+                           the seconds until it fires again, or None to stop
+                           it
+        """
+        with self._condition:
+            self._cancel(key)
+
+            entry = _Entry(time.monotonic() + delay,
+                           next(self._seq),
+                           key,
+                           interval,
+                           next_delay,
+                           callback,
+                           args,
+                           policy or self.policy)
+            self._entries[key] = entry
+            heapq.heappush(self._heap, entry)
+
+            # Only wake the scheduler thread if its next deadline changed.
+            if self._heap[0] is entry:
+                self._condition.notify()
+
+    def update(self, timers=(), cancel=()):
+        """
+        Arms and stops many timers in one go, holding the lock, re-ordering
+        the heap and waking the scheduler thread once instead of per timer.
+
+        :param timers: (key, delay, callback, args, interval, next_delay)
+                       tuples of timers to arm, replacing any timers with the
+                       same keys
+        :param cancel: keys of timers to stop
+        """
+        with self._condition:
+            for key in cancel:
+                self._cancel(key)
+
+            now = time.monotonic()
+
+            for key, delay, callback, args, interval, next_delay in timers:
+                self._cancel(key)
+
+                entry = _Entry(now + delay,
+                               next(self._seq),
+                               key,
+                               interval,
+                               next_delay,
+                               callback,
+                               args,
+                               self.policy)
+                self._entries[key] = entry
+                self._heap.append(entry)
+
+            heapq.heapify(self._heap)
+            self._condition.notify()
+
+    def cancel(self, key):
+        """
+        Stops a timer.
+
+        :param key: timer reference
+        :returns: True if there was a timer to stop
+        """
+        with self._condition:
+            return self._cancel(key)
+
+    def cancel_all(self):
+        """
+        Stops all timers.
+        """
+        with self._condition:
+            self._cancel_all()
+
+    def lag_stats(self, key):
+        """
+        Firing lag statistics of a timer.
+
+        :param key: timer reference
+        :returns: dict with last, max and p99 lag in seconds, None if there is
+                  no such timer
+        :rtype: dict | None
+        """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        return entry.lag.as_dict()
+
+    def interval_stats(self):
+        """
+        Effective intervals of the timers with both an interval and a
+        next_delay function, the delay until their next firing as of their
+        last firing. Timers without an interval, such as calendar
+        schedules, are left out.
+
+        :returns: dict with number of such timers and their min, mean and
+                  max effective interval in seconds
+        :rtype: dict
+        """
+        with self._condition:
+            intervals = [entry.effective for entry in self._entries.values()
+                         if entry.next_delay is not None and
+                         entry.interval is not None]
+
+        if not intervals:
+            return {"timers": 0, "min": 0.0, "mean": 0.0, "max": 0.0}
+
+        return {"timers": len(intervals),
+                "min": min(intervals),
+                "mean": sum(intervals) / len(intervals),
+                "max": max(intervals)}
+
+    def load_histogram(self, window=60):
+        """
+        Number of timer firings due in each second of the next window
+        seconds, to see how evenly the load is spread. Timers without an
+        interval are counted once, adaptive timers at their effective
+        interval.
+
+        :param window: number of seconds to look ahead
+        :returns: list of firing counts, one per second
+        :rtype: [int]
+        """
+        histogram = [0] * window
+
+        with self._condition:
+            now = time.monotonic()
+            end = now + window
+
+            for entry in self._entries.values():
+                deadline = max(entry.deadline, now)
+                interval = entry.interval
+
+                if entry.next_delay is not None and interval is not None:
+                    interval = entry.effective
+
+                if interval is None or interval <= 0:
+                    if deadline < end:
+                        histogram[int(deadline - now)] += 1
+                    continue
+
+                while deadline < end:
+                    histogram[int(deadline - now)] += 1
+                    deadline += interval
+
+        return histogram
+
+    def due(self):
+        """
+        Deadline of the timer whose callback is running on the calling
+        worker thread, as opposed to when it actually fired.
+
+        :returns: wall clock time the timer was due, None if not called from
+                  a timer callback
+        :rtype: float | None
+        """
+        due = getattr(self._local, "due", None)
+
+        if due is None:
+            return None
+
+        return time.time() - (time.monotonic() - due)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cancel(self, key):
+        """
+        Must be called holding _condition.
+        """
+        entry = self._entries.pop(key, None)
+
+        if entry is None:
+            return False
+
+        entry.cancelled = True
+        self._cancelled += 1
+
+        if self._cancelled > _COMPACT_THRESHOLD and \
+                self._cancelled > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if not e.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+        return True
+
+    def _cancel_all(self):
+        """
+        Must be called holding _condition.
+        """
+        for entry in self._entries.values():
+            entry.cancelled = True
+
+        self._entries.clear()
+        self._heap.clear()
+        self._cancelled = 0
+
+    def _run(self):
+        """
+        Scheduler thread loop, sleeps until the earliest deadline and fires
+        every timer that is due.
+        """
+        LOGGER.debug(f"{self.name} thread started")
+
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+
+                while self._heap and (self._heap[0].cancelled or
+                                      self._heap[0].deadline <= now):
+                    entry = heapq.heappop(self._heap)
+
+                    if entry.cancelled:
+                        self._cancelled -= 1
+                    else:
+                        self._fire(entry, now)
+
+                timeout = self._heap[0].deadline - now if self._heap else None
+                self._condition.wait(timeout)
+
+        LOGGER.debug(f"{self.name} thread stopped")
+
+    def _fire(self, entry, now):
+        """
+        Hands a due timer to the workers and re-arms it if it is periodic.
+        Must be called holding _condition.
+        """
+        due = entry.deadline
+
+        if entry.next_delay is not None:
+            delay = entry.next_delay()
+
+            if delay is None:
+                del self._entries[entry.key]
+            else:
+                if entry.interval is not None:
+                    entry.effective = delay
+                entry.deadline = now + delay
+                entry.seq = next(self._seq)
+                heapq.heappush(self._heap, entry)
+        elif entry.interval is None:
+            del self._entries[entry.key]
+        else:
+            entry.deadline += entry.interval
+
+            if entry.deadline <= now and entry.policy == POLICY_SKIP:
+                missed = int((now - entry.deadline) // entry.interval) + 1
+                entry.deadline += missed * entry.interval
+                entry.lag.skipped += missed
+
+            entry.seq = next(self._seq)
+            heapq.heappush(self._heap, entry)
+
+            if entry.pending and entry.policy == POLICY_SKIP:
+                # Previous firing not done yet, do not pile up behind it.
+                entry.lag.skipped += 1
+                return
+
+        entry.pending = True
+        try:
+            self._executor.submit(self._execute, entry, due)
+        except RuntimeError:
+            # Executor shut down, scheduler is stopping.
+            pass
+
+    def _execute(self, entry, due):
+        """
+        Runs a fired timer's callback on a worker thread.
+        """
+        entry.lag.record(time.monotonic() - due)
+        self._local.due = due
+
+        try:
+            entry.callback(*entry.args)
+        except Exception:
+            LOGGER.exception(f"{self.name} timer {entry.key} callback failed")
+        finally:
+            entry.pending = False
+            self._local.due = None
@@ -0,0 +1,149 @@
+import logging
+import threading
+
+from device_controller.config import action_path, device_timer
+from device_controller.config.models import Trigger
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module runs device actions locally when device events occur, without a
+round trip to HINT.
+
+Triggers are indexed by their event, (device UUID, sub-device ID, event ID),
+so matching an incoming event is a single dict lookup no matter how many
+triggers are configured. Index updates copy the affected entry under a lock
+while events are matched without locking.
+"""
+
+
+class TriggerIndex:
+    """
+    Maps events to the actions triggered by them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (uuid, device_id, event_id): ((trigger_id, ActionPath), ...)
+        self._rules = {}
+        # trigger_id: event key, to find a trigger's entry when removing it
+        self._events = {}
+
+    def add(self, trigger_id, event, path):
+        """
+        Adds a trigger, replacing any trigger with the same ID.
+
+        :param trigger_id: trigger reference
+        :param event: (uuid, device_id, event_id) of the triggering event
+        :param path: action path of the triggered action
+        :type path: action_path.ActionPath
+        """
+        with self._lock:
+            self._remove(trigger_id)
+
+            self._rules[event] = \
+                self._rules.get(event, ()) + ((trigger_id, path),)
+            self._events[trigger_id] = event
+
+    def remove(self, trigger_id):
+        """
+        :param trigger_id: trigger reference
+        :returns: True if the trigger was indexed
+        """
+        with self._lock:
+            return self._remove(trigger_id)
+
+    def _remove(self, trigger_id):
+        """
+        Must be called holding _lock.
+        """
+        event = self._events.pop(trigger_id, None)
+
+        if event is None:
+            return False
+
+        rules = tuple(rule for rule in self._rules[event]
+                      if rule[0] != trigger_id)
+
+        if rules:
+            self._rules[event] = rules
+        else:
+            del self._rules[event]
+
+        return True
+
+    def match(self, uuid, device_id, event_id):
+        """
+        :param uuid: UUID of the device the event occurred on
+        :param device_id: sub-device ID, None for the device itself
+        :param event_id: event ID
+        :returns: action paths triggered by the event
+        :rtype: [action_path.ActionPath]
+        """
+        return [path for _trigger_id, path
+                in self._rules.get((uuid, device_id, event_id), ())]
+
+    def clear(self):
+        with self._lock:
+            self._rules = {}
+            self._events = {}
+
+    def __len__(self):
+        return len(self._events)
+
+
+_index = TriggerIndex()
+
+
+def start(trigger: Trigger):
+    """
+    Starts reacting to a trigger's event, replacing the trigger if already
+    started.
+
+    :param trigger: trigger with its devices loaded
+    """
+    LOGGER.debug(f"starting trigger: {trigger}")
+    _index.add(trigger.id, trigger.event, action_path.parse(trigger.action))
+
+
+def stop(trigger: Trigger):
+    """
+    Stops reacting to a trigger's event.
+    """
+    LOGGER.debug(f"stopping trigger: {trigger}")
+    _index.remove(trigger.id)
+
+
+def stop_all():
+    """
+    Stops all triggers.
+    """
+    LOGGER.debug("stopping all triggers")
+    _index.clear()
+
+
+def event(uuid, device_id, event_id):
+    """
+    Executes the actions triggered by a device event.
+
+    :param uuid: UUID of the device the event occurred on
+    :param device_id: sub-device ID, None for the device itself
+    :param event_id: event ID
+    :returns: number of triggered actions
+    """
+    paths = _index.match(uuid, device_id, event_id)
+
+    for path in paths:
+        LOGGER.debug(f"event {uuid},{device_id},{event_id} triggered: {path}")
+        device_timer.execute(path)
+
+    return len(paths)
+
+
+def count():
+    """
+    :returns: number of started triggers
+    """
+    return len(_index)
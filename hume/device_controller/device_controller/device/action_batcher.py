@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+
+from device_controller import settings
+from device_controller.device import single_flight
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module coalesces device actions targeting the same device within a short
+window into a single batched device request. Compound devices with several
+sub-device actions firing at the same time are then sent one request instead
+of one per action, and each action's result is handed back to its submitter.
+Requests are sent through an ActionExecutor, one at a time per device.
+"""
+
+
+# Seconds to wait for more actions on the same device before sending.
+DEFAULT_WINDOW = 0.05
+
+
+class ActionBatcher:
+    """
+    Collects actions per device and flushes them after a window, using a
+    scheduler to time the windows.
+    """
+
+    def __init__(self, scheduler, executor, window=DEFAULT_WINDOW):
+        """
+        :param scheduler: schedules window flushes
+        :type scheduler: device_controller.config.scheduler.Scheduler
+        :param executor: sends the flushed requests
+        :type executor: device_controller.device.action_executor.ActionExecutor
+        :param window: seconds to collect actions before sending them
+        """
+        self.scheduler = scheduler
+        self.executor = executor
+        self.window = window
+
+        self._lock = threading.Lock()
+        # uuid: (device, [(device_id, action_id, callback)])
+        self._pending = {}
+        # UUIDs of devices that did not accept a batch, most devices only
+        # implement single actions
+        self._unbatchable = set()
+
+        self.requests = 0
+        self.actions = 0
+        self.rejected = 0
+
+    def submit(self, device, device_id, action_id, callback, max_age=None):
+        """
+        Queues an action for the next batch to its device. A read action
+        with a cached result at most max_age seconds old is answered from
+        the cache right away instead.
+
+        :type device: Device
+        :param device_id: sub-device ID, None for the device itself
+        :param action_id: ID of the action to execute
+        :param callback: called with the action result, or None on failure
+        :param max_age: seconds old a cached read result may be, None to
+                        always send the action
+        """
+        if max_age is not None:
+            result = single_flight.cached(device,
+                                          device_id,
+                                          action_id,
+                                          max_age)
+
+            if result is not None:
+                _results([(device_id, action_id, callback)], [result])
+                return
+
+        with self._lock:
+            batch = self._pending.get(device.uuid)
+
+            if batch is None:
+                batch = (device, [])
+                self._pending[device.uuid] = batch
+
+            # Also re-arms the flush of a batch whose flush was cancelled
+            if ("batch", device.uuid) not in self.scheduler:
+                self.scheduler.schedule(("batch", device.uuid),
+                                        self.window,
+                                        self._flush,
+                                        device.uuid)
+
+            batch[1].append((device_id, action_id, callback))
+
+    def stop(self):
+        """
+        Fails the actions of batches not flushed yet, their callbacks are
+        called with None. Called when the scheduler has been stopped, which
+        cancels the flushes.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for _device, actions in pending.values():
+            _results(actions, [None] * len(actions))
+
+    def _flush(self, uuid):
+        """
+        Hands all actions collected for a device to the executor.
+
+        :param uuid: device UUID
+        """
+        with self._lock:
+            batch = self._pending.pop(uuid, None)
+
+        if batch is None:
+            return
+
+        device, actions = batch
+
+        if not self.executor.submit(uuid, self._send, device, actions):
+            LOGGER.warning(f"device action queue full, dropping "
+                           f"{len(actions)} actions to device {uuid}")
+
+            with self._lock:
+                self.rejected += len(actions)
+
+            _results(actions, [None] * len(actions))
+
+    def _send(self, device, actions):
+        """
+        Sends actions to a device, in one request if there are several and
+        the device accepts batches. A device that does not is remembered and
+        sent single actions from then on, instead of a failing batch request
+        before each.
+
+        :type device: Device
+        :param actions: [(device_id, action_id, callback)]
+        """
+        uuid = device.uuid
+        requests = 0
+        read_at = time.monotonic()
+        results = None
+
+        # The HTT device request module has no batches
+        batch_action = getattr(settings.device_req_mod(), "batch_action", None)
+
+        with self._lock:
+            batchable = uuid not in self._unbatchable
+
+        try:
+            if len(actions) > 1 and batchable and batch_action is not None:
+                requests += 1
+                results = batch_action(
+                    device,
+                    [(device_id, action_id)
+                     for device_id, action_id, _callback in actions]
+                )
+
+                if results is None:
+                    LOGGER.info(f"device {uuid} did not accept a batch, "
+                                f"sending its actions one by one from now "
+                                f"on")
+
+                    with self._lock:
+                        self._unbatchable.add(uuid)
+                else:
+                    # Batched reads bypass single_flight, cache them here
+                    for (device_id, action_id, _callback), result \
+                            in zip(actions, results):
+                        single_flight.remember(device,
+                                               device_id,
+                                               action_id,
+                                               result,
+                                               read_at)
+
+            if results is None:
+                results = [_single_action(device, device_id, action_id)
+                           for device_id, action_id, _callback in actions]
+                requests += len(actions)
+        except Exception:
+            # Callbacks must still be called, they track completion
+            LOGGER.exception(f"actions to device {uuid} failed")
+            results = [None] * len(actions)
+
+        with self._lock:
+            self.requests += requests
+            self.actions += len(actions)
+
+        _results(actions, results)
+
+    def stats(self):
+        """
+        :returns: number of actions, of device requests they were sent in, of
+                  actions rejected because the executor queue was full and
+                  of devices that do not accept batches
+        :rtype: dict
+        """
+        return {"actions": self.actions,
+                "requests": self.requests,
+                "rejected": self.rejected,
+                "unbatchable": len(self._unbatchable)}
+
+
+def _results(actions, results):
+    """
+    Hands results to the callbacks of their actions.
+    """
+    for (_device_id, _action_id, callback), result in zip(actions, results):
+        try:
+            callback(result)
+        except Exception:
+            LOGGER.exception("action result callback failed")
+
+
+def _single_action(device, device_id, action_id):
+    """
+    Sends one device or sub-device action.
+    """
+    if device_id is None:
+        return single_flight.device_action(device, action_id)
+
+    return single_flight.sub_device_action(device, device_id, action_id)
@@ -0,0 +1,162 @@
+import collections
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module runs device requests on a bounded pool of threads. Work for the
+same device is queued and run one at a time, in order, so a device is never
+sent more than one request at once, and a slow device only delays its own
+queue. The number of requests in flight is capped globally, and so is the
+number of queued requests, work beyond it is rejected instead of piling up.
+"""
+
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_QUEUE_SIZE = 1024
+
+# Number of recent queue wait times kept for percentiles.
+WAIT_SAMPLES = 256
+
+
+class ActionExecutor:
+    """
+    Bounded executor with a serialization queue per device.
+    """
+
+    def __init__(self,
+                 concurrency=DEFAULT_CONCURRENCY,
+                 queue_size=DEFAULT_QUEUE_SIZE,
+                 name="device-action"):
+        """
+        :param concurrency: max number of devices worked on at once
+        :param queue_size: max number of queued work items over all devices
+        :param name: thread name prefix
+        """
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.name = name
+
+        self._lock = threading.Lock()
+        # uuid: deque of (enqueued at, func, args), only devices with work
+        self._queues = {}
+        self._queued = 0
+        self._pool = None
+
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self._waits = collections.deque(maxlen=WAIT_SAMPLES)
+
+    def start(self):
+        """
+        Starts the worker threads, does nothing if already started.
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.concurrency,
+                    thread_name_prefix=self.name
+                )
+
+    def stop(self):
+        """
+        Drops queued work and waits for running work to finish.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._queues = {}
+            self._queued = 0
+
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def submit(self, uuid, func, *args):
+        """
+        Queues work for a device, run after the device's earlier work.
+
+        :param uuid: UUID of the device the work is for
+        :param func: called with args on a worker thread
+        :returns: False if the work was rejected because the queue is full
+                  or the executor is stopped
+        """
+        with self._lock:
+            if self._pool is None or self._queued >= self.queue_size:
+                self.rejected += 1
+                return False
+
+            queue = self._queues.get(uuid)
+            idle = queue is None
+
+            if idle:
+                queue = collections.deque()
+                self._queues[uuid] = queue
+
+            queue.append((time.monotonic(), func, args))
+            self._queued += 1
+            self.max_depth = max(self.max_depth, self._queued)
+
+            # Devices with work already have a drain on the pool.
+            if idle:
+                self._pool.submit(self._drain, uuid)
+
+        return True
+
+    def _drain(self, uuid):
+        """
+        Runs the next work item of a device, then puts the device back on the
+        pool if it has more, behind other devices waiting for a thread.
+        """
+        with self._lock:
+            queue = self._queues.get(uuid)
+
+            if not queue:
+                return
+
+            enqueued, func, args = queue.popleft()
+            self._queued -= 1
+            self.running += 1
+            self._waits.append(time.monotonic() - enqueued)
+
+        try:
+            func(*args)
+        except Exception:
+            LOGGER.exception(f"device {uuid} work failed")
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+                if queue:
+                    if self._pool is not None:
+                        self._pool.submit(self._drain, uuid)
+                elif self._queues.get(uuid) is queue:
+                    del self._queues[uuid]
+
+    def stats(self):
+        """
+        :returns: queue depth, max queue depth, running, completed and
+                  rejected work, and queue wait times in seconds
+        :rtype: dict
+        """
+        with self._lock:
+            waits = sorted(self._waits)
+
+            return {
+                "queued": self._queued,
+                "max_queued": self.max_depth,
+                "devices": len(self._queues),
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p99": waits[int(len(waits) * 0.99)] if waits else 0.0,
+                "wait_max": waits[-1] if waits else 0.0,
+            }
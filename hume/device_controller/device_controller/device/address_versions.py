@@ -0,0 +1,26 @@
+"""
+This module keeps a version number per device that is bumped whenever the
+device's address changes or the device is removed. Holders of a cached device
+reference compare versions to know when to look the device up again.
+"""
+
+
+_versions: {str: int} = {}
+
+
+def get(uuid):
+    """
+    :param uuid: device UUID
+    :returns: current address version of the device
+    :rtype: int
+    """
+    return _versions.get(uuid, 0)
+
+
+def bump(uuid):
+    """
+    Invalidates cached references to a device.
+
+    :param uuid: device UUID
+    """
+    _versions[uuid] = _versions.get(uuid, 0) + 1
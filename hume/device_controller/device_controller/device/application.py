@@ -5,16 +5,46 @@ from bottle import run
 
 import hume_storage as storage
 
-from device_controller.device.http_server import MyServer
-from device_controller.device.models import Device
+from device_controller.device import (
+    attach_admission,
+    device_client,
+    device_queue,
+    device_req_lib,
+    event_pipeline,
+    liveness,
+    single_flight
+)
+from device_controller.device.heartbeat import (
+    HeartbeatScheduler,
+    DEFAULT_INTERVAL as DEFAULT_HEARTBEAT_INTERVAL
+)
+from device_controller.device.http_server import (
+    MyServer,
+    SERVER_MODE_THREADED,
+    create_server
+)
+from device_controller.device.models import Device, DeviceCapability
 from device_controller.device import routes  # noqa
-from device_controller.util.args import get_arg, TEST_RUN_DEVICE_SIMULATOR
+from device_controller.util.args import (
+    get_arg,
+    TEST_RUN_DEVICE_SIMULATOR,
+    DEVICE_SERVER_MODE,
+    DEVICE_SERVER_WORKERS,
+    EVENT_QUEUE_SIZE,
+    ATTACH_WINDOW,
+    ATTACH_MAX_PENDING,
+    DEVICE_CONNECT_TIMEOUT,
+    DEVICE_READ_TIMEOUT,
+    DEVICE_RATE_LIMITS,
+    HEARTBEAT_INTERVAL
+)
 
 
 LOGGER = logging.getLogger(__name__)
 
-server = MyServer(host='localhost', port=8081)
+server: MyServer
 server_thread: threading.Thread
+heartbeats: HeartbeatScheduler
 
 
 def model_init():
@@ -23,6 +53,7 @@ def model_init():
     """
     LOGGER.info("model-init")
     storage.register(Device)
+    storage.register(DeviceCapability)
 
 
 def pre_start():
@@ -31,6 +62,13 @@ def pre_start():
     """
     LOGGER.info("pre-start")
 
+    device_client.configure(
+        connect_timeout=get_arg(DEVICE_CONNECT_TIMEOUT),
+        read_timeout=get_arg(DEVICE_READ_TIMEOUT)
+    )
+
+    device_queue.configure(dict(get_arg(DEVICE_RATE_LIMITS) or []))
+
 
 def start():
     """
@@ -38,6 +76,33 @@ def start():
     """
     LOGGER.info("device listener start")
 
+    # Arguments are only set when started through main
+    event_pipeline.start(queue_size=get_arg(EVENT_QUEUE_SIZE) or
+                         event_pipeline.DEFAULT_QUEUE_SIZE)
+
+    global server
+    mode = get_arg(DEVICE_SERVER_MODE)
+    LOGGER.debug(f"device listener mode: {mode}")
+
+    # Attaches are only handled concurrently by the threaded server, in the
+    # single mode a window would only delay each attach. A window of 0 is
+    # valid, so only a missing argument falls back to the default.
+    attach_window = 0
+    if mode == SERVER_MODE_THREADED:
+        attach_window = get_arg(ATTACH_WINDOW)
+        if attach_window is None:
+            attach_window = attach_admission.WINDOW
+
+    attach_admission.start(
+        window=attach_window,
+        max_pending=get_arg(ATTACH_MAX_PENDING) or attach_admission.MAX_PENDING
+    )
+
+    server = create_server('localhost',
+                           8081,
+                           mode=mode,
+                           workers=get_arg(DEVICE_SERVER_WORKERS))
+
     def start_http_server():
         """
         Starts an HTTP server locally on port 8081. This is the server that
@@ -50,6 +115,18 @@ def start():
     server_thread = threading.Thread(target=start_http_server)
     server_thread.start()
 
+    for device in storage.get_all(Device):
+        if device.attached:
+            liveness.track(device.uuid)
+
+    global heartbeats
+    # Arguments are only set when started through main
+    heartbeats = HeartbeatScheduler(
+        liveness.get_table(),
+        interval=get_arg(HEARTBEAT_INTERVAL) or DEFAULT_HEARTBEAT_INTERVAL
+    )
+    heartbeats.start()
+
     if get_arg(TEST_RUN_DEVICE_SIMULATOR):
         from device_controller.device.simulator import start_simulator
         start_simulator()
@@ -64,6 +141,63 @@ def stop():
     server.shutdown()
     server_thread.join()
 
+    heartbeats.stop()
+    event_pipeline.stop()
+    attach_admission.stop()
+
+    device_client.close()
+
     if get_arg(TEST_RUN_DEVICE_SIMULATOR):
         from device_controller.device.simulator import stop_simulator
         stop_simulator()
+
+
+def device_action(device, action_id, max_age=None):
+    """
+    Executes an action on a device.
+
+    :type device: Device
+    :param action_id: ID of the action to execute
+    :param max_age: seconds old a cached read result may be, None to always
+                    read from the device
+    :returns: None or action result as a dictionary
+    """
+    LOGGER.debug(f"device action: {device.uuid} {action_id}")
+
+    return single_flight.device_action(device, action_id, max_age=max_age)
+
+
+def sub_device_action(device, device_id, action_id, max_age=None):
+    """
+    Executes an action on a sub-device.
+
+    :type device: Device
+    :param device_id: ID of the sub-device
+    :param action_id: ID of the action to execute
+    :param max_age: seconds old a cached read result may be, None to always
+                    read from the device
+    :returns: None or action result as a dictionary
+    """
+    LOGGER.debug(f"sub-device action: {device.uuid} {device_id} {action_id}")
+
+    return single_flight.sub_device_action(device,
+                                           device_id,
+                                           action_id,
+                                           max_age=max_age)
+
+
+def device_latency(uuid):
+    """
+    Latency profile of a device.
+
+    :param uuid: device UUID
+    :returns: round trip time statistics, read timeout and circuit state, None
+              if the device is unknown
+    :rtype: dict | None
+    """
+    device = storage.get(Device, uuid)
+
+    if device is None:
+        return None
+
+    return device_req_lib.latency_profile(device)
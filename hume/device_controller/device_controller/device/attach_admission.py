@@ -0,0 +1,265 @@
+import logging
+import math
+import random
+import threading
+import time
+
+from device_controller.device import device_req_handler
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module admits device attach messages, as when every device attaches at
+once after a power cut. Attaches arriving within WINDOW seconds of each
+other, or while the previous write is in progress, are written to storage
+together in one transaction instead of one transaction each. The request
+handling an attach waits for the write of its batch, so a device that got an
+answer is saved.
+
+Admission is bounded, once MAX_PENDING attaches are waiting to be written
+further attaches are refused with the number of seconds to retry after,
+estimated from the backlog and the recent write rate and spread out so that
+refused devices do not all come back at the same moment.
+
+Coalescing needs attaches handled concurrently, that is the threaded device
+server mode. In the single mode each attach is written on its own, without
+waiting for a window.
+"""
+
+
+# Seconds to wait for more attaches before writing a batch.
+WINDOW = 0.01
+MAX_PENDING = 1024
+
+# Seconds a request waits for its batch to be written.
+WRITE_TIMEOUT = 10.0
+
+# Bounds of the Retry-After of a refused attach, in seconds.
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 30
+
+
+class _Batch:
+    """
+    Attach messages written together, and the outcome of the write.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.written = threading.Event()
+        self.ok = False
+
+
+class AttachAdmission:
+    """
+    Coalesces attach messages into batched storage writes and refuses them
+    when saturated.
+    """
+
+    def __init__(self, write, window=WINDOW, max_pending=MAX_PENDING):
+        """
+        :param write: called with a list of attach messages to write in one
+                      transaction, on the writer thread
+        :param window: seconds to wait for more attaches before writing
+        :param max_pending: max number of attaches waiting to be written
+        """
+        self.write = write
+        self.window = window
+        self.max_pending = max_pending
+
+        self._cond = threading.Condition()
+        self._batch = _Batch()
+        self._pending = 0
+        self._running = False
+        self._thread = None
+        # Attaches written per second, measured on the last write
+        self._rate = None
+
+        self.admitted = 0
+        self.refused = 0
+        self.writes = 0
+        self.written = 0
+
+    def start(self):
+        """
+        Starts the writer thread.
+        """
+        self._running = True
+        self._thread = threading.Thread(target=self._run,
+                                        name="attach-admission",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Writes the admitted attaches and stops the writer thread.
+        """
+        if self._thread is None:
+            return
+
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, records, timeout=WRITE_TIMEOUT):
+        """
+        Admits attach messages and waits until they are written.
+
+        :param records: attach messages, at most max_pending
+        :type records: [dict]
+        :param timeout: seconds to wait for the write
+        :returns: None if the attaches were written, otherwise seconds after
+                  which to retry
+        :rtype: int | None
+        :raises ValueError: if there are more records than max_pending, they
+                            could never be admitted
+        """
+        if len(records) > self.max_pending:
+            raise ValueError(f"{len(records)} attaches exceed the max of "
+                             f"{self.max_pending} pending attaches")
+
+        with self._cond:
+            if not self._running or \
+                    self._pending + len(records) > self.max_pending:
+                self.refused += len(records)
+                return self._retry_after()
+
+            batch = self._batch
+            batch.records.extend(records)
+            self._pending += len(records)
+            self.admitted += len(records)
+            self._cond.notify()
+
+        if batch.written.wait(timeout) and batch.ok:
+            return None
+
+        return self._retry_after()
+
+    def _retry_after(self):
+        """
+        :returns: seconds to retry after, the estimated time to write the
+                  backlog spread out over up to twice as long
+        :rtype: int
+        """
+        if self._rate:
+            drain = math.ceil(self._pending / self._rate)
+        else:
+            drain = MIN_RETRY_AFTER
+
+        drain = min(max(drain, MIN_RETRY_AFTER), MAX_RETRY_AFTER)
+
+        return random.randint(drain, min(2 * drain, MAX_RETRY_AFTER))
+
+    def _run(self):
+        """
+        Writer thread loop, writes admitted attaches in batches.
+        """
+        while True:
+            with self._cond:
+                while self._running and not self._batch.records:
+                    self._cond.wait()
+
+                if not self._running and not self._batch.records:
+                    return
+
+            # Let more attaches join the batch
+            if self.window:
+                time.sleep(self.window)
+
+            with self._cond:
+                batch, self._batch = self._batch, _Batch()
+
+            self._write(batch)
+
+            with self._cond:
+                self._pending -= len(batch.records)
+
+            batch.written.set()
+
+    def _write(self, batch):
+        """
+        Writes a batch, marking it as failed if the write raises.
+        """
+        start = time.monotonic()
+
+        try:
+            self.write(batch.records)
+        except Exception:
+            LOGGER.exception(f"failed to write {len(batch.records)} "
+                             f"device attaches")
+            return
+
+        batch.ok = True
+        self.writes += 1
+        self.written += len(batch.records)
+        self._rate = len(batch.records) / max(time.monotonic() - start, 1e-3)
+
+    def stats(self):
+        """
+        :returns: number of attaches admitted, refused and written, number of
+                  writes and attaches waiting to be written
+        :rtype: dict
+        """
+        return {"admitted": self.admitted,
+                "refused": self.refused,
+                "written": self.written,
+                "writes": self.writes,
+                "pending": self._pending}
+
+
+_admission = AttachAdmission(device_req_handler.attach_many)
+
+
+def start(window=WINDOW, max_pending=MAX_PENDING):
+    """
+    Starts admitting device attaches.
+
+    :param window: seconds to wait for more attaches before writing
+    :param max_pending: max number of attaches waiting to be written
+    """
+    global _admission
+    _admission = AttachAdmission(device_req_handler.attach_many,
+                                 window=window,
+                                 max_pending=max_pending)
+    _admission.start()
+
+
+def stop():
+    """
+    Writes the admitted attaches and stops admitting.
+    """
+    _admission.stop()
+
+
+def submit(records):
+    """
+    Admits device attach messages and waits until they are written.
+
+    :param records: attach messages, at most max_batch
+    :type records: [dict]
+    :returns: None if the attaches were written, otherwise seconds after which
+              to retry
+    :rtype: int | None
+    """
+    return _admission.submit(records)
+
+
+def max_batch():
+    """
+    :returns: max number of attach messages that can be submitted at once
+    :rtype: int
+    """
+    return _admission.max_pending
+
+
+def stats():
+    """
+    :returns: attach admission statistics
+    :rtype: dict
+    """
+    return _admission.stats()
@@ -0,0 +1,178 @@
+import json
+import logging
+import threading
+import time
+
+from types import MappingProxyType
+
+import hume_storage
+
+from device_controller.device import capability_registry
+from device_controller.device.models import DeviceCapability
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module caches device capabilities by device UUID to avoid re-fetching
+them on every discovery. A cached capability is valid until its TTL runs out
+or until the device attaches with a capability fingerprint differing from
+the one it had when the capability was cached. Cached capabilities are
+interned in the capability registry, devices of the same model share one copy.
+"""
+
+
+# Seconds a cached capability is valid.
+DEFAULT_TTL = 3600.0
+
+_lock = threading.Lock()
+
+# uuid: (shared capability, fingerprint, expiry)
+_entries: {str: (MappingProxyType, str, float)} = {}
+# uuid: fingerprint from the device's latest attach
+_fingerprints: {str: str} = {}
+
+_ttl = DEFAULT_TTL
+
+_hits = 0
+_misses = 0
+
+
+def configure(ttl=None):
+    """
+    :param ttl: seconds a cached capability is valid, None keeps the default
+    """
+    global _ttl
+    _ttl = ttl or DEFAULT_TTL
+
+
+def get(uuid):
+    """
+    Get the cached capability of a device.
+
+    :param uuid: device UUID
+    :returns: device capabilities or None if not cached, expired, or stale
+    :rtype: dict | None
+    """
+    global _hits, _misses
+
+    with _lock:
+        entry = _entries.get(uuid)
+
+        if entry is not None:
+            capability, fingerprint, expiry = entry
+
+            if expiry > time.monotonic() and \
+                    fingerprint == _fingerprints.get(uuid):
+                _hits += 1
+                return capability_registry.expand(uuid, capability)
+
+            del _entries[uuid]
+
+        _misses += 1
+        return None
+
+
+def put(uuid, capability):
+    """
+    Cache a device capability, tied to the device's latest fingerprint.
+
+    :param uuid: device UUID
+    :param capability: device capabilities
+    :type capability: dict
+    """
+    shared = capability_registry.register(uuid, capability)
+
+    with _lock:
+        _entries[uuid] = (shared,
+                          _fingerprints.get(uuid),
+                          time.monotonic() + _ttl)
+
+
+def attached(uuid, fingerprint):
+    """
+    Called when a device attaches. The cached capability is dropped if the
+    device reports a different fingerprint than before, or no fingerprint.
+
+    :param uuid: device UUID
+    :param fingerprint: capability fingerprint from the attach message
+    :type fingerprint: str | None
+    """
+    with _lock:
+        if fingerprint is None or _fingerprints.get(uuid) != fingerprint:
+            if _entries.pop(uuid, None) is not None:
+                LOGGER.debug(f"capability fingerprint changed for {uuid}, "
+                             f"cache entry invalidated")
+
+        _fingerprints[uuid] = fingerprint
+
+
+def persist(uuid, capability=None):
+    """
+    Persists a device's capability, for example when it is attached, so that
+    it is known after a restart, see Device.capability.
+
+    :param uuid: device UUID
+    :param capability: capability document to register and persist, defaults
+                       to the registered one
+    :type capability: dict | None
+    :returns: False if the device has no known capability
+    """
+    if capability is not None:
+        capability_registry.register(uuid, capability)
+
+    capability = capability_registry.document(uuid)
+
+    if capability is None:
+        return False
+
+    stored = hume_storage.get(DeviceCapability, uuid)
+
+    if stored is None:
+        stored = DeviceCapability(uuid=uuid)
+
+    stored.document = json.dumps(capability)
+    hume_storage.save(stored)
+
+    return True
+
+
+def invalidate(uuid):
+    """
+    Drop everything cached for a device, and its persisted capability.
+
+    :param uuid: device UUID
+    """
+    with _lock:
+        _entries.pop(uuid, None)
+        _fingerprints.pop(uuid, None)
+
+    capability_registry.unregister(uuid)
+
+    stored = hume_storage.get(DeviceCapability, uuid)
+
+    if stored is not None:
+        hume_storage.delete(stored)
+
+
+def clear():
+    """
+    Drop all cached capabilities and reset counters.
+    """
+    global _hits, _misses
+
+    with _lock:
+        _entries.clear()
+        _fingerprints.clear()
+        _hits = 0
+        _misses = 0
+
+
+def stats():
+    """
+    :returns: cache hit/miss counters and number of cached capabilities
+    :rtype: dict
+    """
+    with _lock:
+        return {"hits": _hits, "misses": _misses, "size": len(_entries)}
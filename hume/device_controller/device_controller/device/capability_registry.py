@@ -0,0 +1,229 @@
+import hashlib
+import json
+import logging
+import sys
+import threading
+
+from types import MappingProxyType
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module interns device capability documents. Apart from the device UUID,
+capability documents are identical for every unit of the same model and
+firmware, so only one immutable copy of each distinct document is kept and
+devices refer to it by reference.
+"""
+
+
+# Capability document fields that are specific to a single device unit.
+DEVICE_FIELDS = ("uuid",)
+
+_lock = threading.Lock()
+
+# model key: frozen capability document
+_documents: {str: MappingProxyType} = {}
+# model key: size in bytes of one frozen document
+_document_sizes: {str: int} = {}
+# model key: number of devices referring to the document
+_references: {str: int} = {}
+# device uuid: model key
+_devices: {str: str} = {}
+
+
+def _freeze(obj):
+    """
+    Returns a compact, immutable copy of a parsed JSON object. Dicts become
+    read-only mappings with interned keys and lists become tuples.
+    """
+    if isinstance(obj, dict):
+        return MappingProxyType(
+            {sys.intern(key): _freeze(value) for key, value in obj.items()}
+        )
+    elif isinstance(obj, list):
+        return tuple(_freeze(value) for value in obj)
+    elif isinstance(obj, str):
+        return sys.intern(obj)
+
+    return obj
+
+
+def _thaw(obj):
+    """
+    Returns a mutable, JSON serializable copy of a frozen object.
+    """
+    if isinstance(obj, MappingProxyType):
+        return {key: _thaw(value) for key, value in obj.items()}
+    elif isinstance(obj, tuple):
+        return [_thaw(value) for value in obj]
+
+    return obj
+
+
+def _deep_size(obj):
+    """
+    Approximate size in bytes of a parsed JSON object. Keys and small
+    numbers are not counted since they are shared by the interpreter.
+    """
+    if isinstance(obj, (dict, MappingProxyType)):
+        return sys.getsizeof(obj) + sum(_deep_size(value)
+                                        for value in obj.values())
+    elif isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_deep_size(value) for value in obj)
+    elif isinstance(obj, (str, float)):
+        return sys.getsizeof(obj)
+
+    return 0
+
+
+def model_key(capability):
+    """
+    Returns a key identifying the model and firmware of a capability
+    document, the content hash of its non device-specific fields.
+
+    :type capability: dict
+    :rtype: str
+    """
+    model_doc = {field: value for field, value in capability.items()
+                 if field not in DEVICE_FIELDS}
+    encoded = json.dumps(model_doc, sort_keys=True).encode('utf-8')
+
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def register(uuid, capability):
+    """
+    Interns a device's capability document and points the device to it.
+
+    :param uuid: device UUID
+    :param capability: capability document as received from the device
+    :type capability: dict
+    :returns: the shared, frozen capability document
+    :rtype: MappingProxyType
+    """
+    key = model_key(capability)
+
+    with _lock:
+        document = _documents.get(key)
+
+        if document is None:
+            document = _freeze({field: value
+                                for field, value in capability.items()
+                                if field not in DEVICE_FIELDS})
+            _documents[key] = document
+            _document_sizes[key] = _deep_size(capability)
+            LOGGER.debug(f"new capability model: {capability.get('name')} "
+                         f"({key})")
+
+        previous_key = _devices.get(uuid)
+        if previous_key != key:
+            if previous_key is not None:
+                _release(previous_key)
+            _devices[uuid] = key
+            _references[key] = _references.get(key, 0) + 1
+
+    return document
+
+
+def get(uuid):
+    """
+    Get the shared capability document of a device.
+
+    :param uuid: device UUID
+    :returns: frozen capability document without device fields, or None
+    :rtype: MappingProxyType | None
+    """
+    key = _devices.get(uuid)
+
+    if key is None:
+        return None
+
+    return _documents.get(key)
+
+
+def document(uuid):
+    """
+    Get the full capability document of a device, as it was received.
+
+    :param uuid: device UUID
+    :returns: capability document or None if the device has none registered
+    :rtype: dict | None
+    """
+    shared = get(uuid)
+
+    if shared is None:
+        return None
+
+    return expand(uuid, shared)
+
+
+def expand(uuid, shared):
+    """
+    Returns a full, mutable capability document for a device from its shared
+    document.
+
+    :param uuid: device UUID
+    :param shared: frozen capability document
+    :type shared: MappingProxyType
+    :rtype: dict
+    """
+    capability = _thaw(shared)
+    capability["uuid"] = uuid
+
+    return capability
+
+
+def unregister(uuid):
+    """
+    Removes a device, and its document if no other device refers to it.
+
+    :param uuid: device UUID
+    """
+    with _lock:
+        key = _devices.pop(uuid, None)
+
+        if key is not None:
+            _release(key)
+
+
+def _release(key):
+    """
+    Drops a device reference to a document, and the document if it was the
+    last one. Must be called holding _lock.
+
+    :param key: model key
+    """
+    _references[key] -= 1
+
+    if _references[key] == 0:
+        del _references[key]
+        del _documents[key]
+        del _document_sizes[key]
+
+
+def clear():
+    """
+    Removes all devices and documents.
+    """
+    with _lock:
+        _devices.clear()
+        _references.clear()
+        _documents.clear()
+        _document_sizes.clear()
+
+
+def stats():
+    """
+    :returns: number of devices and models, and approximate bytes saved
+              compared to keeping one document copy per device
+    :rtype: dict
+    """
+    with _lock:
+        bytes_saved = sum(_document_sizes[key] * (count - 1)
+                          for key, count in _references.items())
+
+        return {"devices": len(_devices),
+                "models": len(_documents),
+                "bytes_saved": bytes_saved}
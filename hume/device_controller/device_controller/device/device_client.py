@@ -0,0 +1,121 @@
+import logging
+import threading
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module manages the outbound HTTP client used for all device requests. A
+single session keeps one keep-alive connection pool per device host so that
+repeated requests to a device skip the connection setup.
+"""
+
+
+DEFAULT_CONNECT_TIMEOUT = 2.0
+DEFAULT_READ_TIMEOUT = 5.0
+
+# Number of per-host pools kept, least recently used pools are discarded.
+MAX_HOST_POOLS = 512
+# Connections kept alive per device host. Devices are small, few are needed.
+CONNECTIONS_PER_HOST = 2
+
+_session: requests.Session = None
+_session_lock = threading.Lock()
+
+_timeout = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+
+
+def configure(connect_timeout=None, read_timeout=None):
+    """
+    Sets the timeouts used for device requests, None keeps the default.
+
+    :param connect_timeout: seconds to wait for a connection to be set up
+    :param read_timeout: seconds to wait for a device to respond
+    """
+    global _timeout
+    _timeout = (connect_timeout or DEFAULT_CONNECT_TIMEOUT,
+                read_timeout or DEFAULT_READ_TIMEOUT)
+    LOGGER.debug(f"device client timeouts: {_timeout}")
+
+
+def timeouts():
+    """
+    :returns: configured (connect, read) timeout
+    """
+    return _timeout
+
+
+def _get_session():
+    """
+    Returns the shared session, creating it on first use.
+
+    :rtype: requests.Session
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=MAX_HOST_POOLS,
+                                      pool_maxsize=CONNECTIONS_PER_HOST,
+                                      max_retries=0)
+                session.mount("http://", adapter)
+                _session = session
+
+    return _session
+
+
+def close():
+    """
+    Closes all pooled connections.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            LOGGER.debug("closing device client session")
+            _session.close()
+            _session = None
+
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Sends a request to a device using a pooled connection.
+
+    :param method: HTTP method
+    :param url: device URL
+    :param timeout: (connect, read) timeout, defaults to configured values
+    :param kwargs: passed on to requests
+    :returns: response or None if the device could not be reached
+    :rtype: requests.Response | None
+    """
+    try:
+        return _get_session().request(method,
+                                      url,
+                                      timeout=timeout or _timeout,
+                                      **kwargs)
+    except requests.exceptions.RequestException as e:
+        LOGGER.warning(f"device request {method} {url} failed: {e}")
+        return None
+
+
+def get(url, **kwargs):
+    """
+    :param url: device URL
+    :rtype: requests.Response | None
+    """
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """
+    :param url: device URL
+    :rtype: requests.Response | None
+    """
+    return request("POST", url, **kwargs)
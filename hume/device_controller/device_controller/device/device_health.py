@@ -0,0 +1,207 @@
+import collections
+import logging
+import threading
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module tracks the request round trip times of each device and uses them
+for adaptive timeouts and circuit breaking.
+
+Round trip times are smoothed as in TCP, a smoothed RTT and RTT variation
+updated with each response, and the read timeout of the next request is the
+smoothed RTT plus four variations, bounded by the configured timeout. A
+responsive device then gives up on a hung request in a fraction of the fixed
+timeout.
+
+A device failing FAILURE_THRESHOLD requests in a row has its circuit opened,
+requests to it fail immediately without being sent. After a while one
+request is let through to probe if the device has recovered, closing the
+circuit again if it succeeds and keeping it open twice as long if not.
+"""
+
+
+# Circuit states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = 5
+OPEN_SECONDS = 30.0
+MAX_OPEN_SECONDS = 300.0
+
+# Adaptive read timeouts are never shorter than this.
+MIN_TIMEOUT = 1.0
+
+# EWMA gains, as in TCP (RFC 6298).
+ALPHA = 1 / 8
+BETA = 1 / 4
+
+# Number of recent round trip times kept for percentiles.
+RTT_SAMPLES = 64
+
+
+class DeviceHealth:
+    """
+    Round trip times and circuit breaker of one device.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        self.srtt = None
+        self.rttvar = None
+        self._samples = collections.deque(maxlen=RTT_SAMPLES)
+
+        self.state = CLOSED
+        self.failures = 0
+        self.open_seconds = OPEN_SECONDS
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self):
+        """
+        :returns: True if a request may be sent to the device, False to fail
+                  it fast
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN and \
+                    time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probing = False
+
+            # One request at a time probes a half-open circuit
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+
+            return False
+
+    def timeout(self, default):
+        """
+        :param default: configured (connect, read) timeout
+        :returns: (connect, read) timeout for the next request
+        """
+        connect, read = default
+
+        if self.srtt is None:
+            return default
+
+        return connect, min(max(self.srtt + 4 * self.rttvar, MIN_TIMEOUT),
+                            read)
+
+    def success(self, rtt):
+        """
+        Records a response.
+
+        :param rtt: seconds the request took
+        """
+        with self._lock:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar += BETA * (abs(self.srtt - rtt) - self.rttvar)
+                self.srtt += ALPHA * (rtt - self.srtt)
+
+            self._samples.append(rtt)
+
+            if self.state != CLOSED:
+                LOGGER.info("device recovered, closing circuit")
+
+            self.state = CLOSED
+            self.failures = 0
+            self.open_seconds = OPEN_SECONDS
+            self._probing = False
+
+    def failure(self):
+        """
+        Records a request that got no response.
+
+        :returns: True if this opened the circuit
+        """
+        with self._lock:
+            self.failures += 1
+
+            if self.state == HALF_OPEN:
+                # Still failing, stay away twice as long
+                self.open_seconds = min(self.open_seconds * 2,
+                                        MAX_OPEN_SECONDS)
+            elif self.state == OPEN or self.failures < FAILURE_THRESHOLD:
+                return False
+
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+            return True
+
+    def profile(self, default):
+        """
+        :param default: configured (connect, read) timeout
+        :returns: latency profile, smoothed RTT, RTT variation and
+                  percentiles in seconds, current read timeout and circuit
+                  state
+        :rtype: dict
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+
+        def percentile(p):
+            if not samples:
+                return None
+            return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+        return {"srtt": self.srtt,
+                "rttvar": self.rttvar,
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+                "timeout": self.timeout(default)[1],
+                "state": self.state,
+                "failures": self.failures}
+
+
+# uuid: DeviceHealth
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get(uuid):
+    """
+    :param uuid: device UUID
+    :returns: health of the device, created on first use
+    :rtype: DeviceHealth
+    """
+    health = _health.get(uuid)
+
+    if health is None:
+        with _health_lock:
+            health = _health.setdefault(uuid, DeviceHealth())
+
+    return health
+
+
+def reset(uuid):
+    """
+    Forgets a device's round trip times and closes its circuit, for example
+    when it has re-attached with a new address.
+
+    :param uuid: device UUID
+    """
+    with _health_lock:
+        _health.pop(uuid, None)
+
+
+def open_circuits():
+    """
+    :returns: UUIDs of devices whose circuit is not closed
+    """
+    return [uuid for uuid, health in list(_health.items())
+            if health.state != CLOSED]
@@ -1,46 +1,173 @@
 import logging
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
 
 import hume_storage
 
 from device_controller.device.models import Device
-from device_controller.device import device_req_lib
+from device_controller.device import (
+    device_req_lib,
+    capability_cache,
+    address_versions,
+    liveness,
+    single_flight
+)
 from device_controller import dispatch
 from device_controller import defs
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Max number of capability requests in flight during discovery.
+DISCOVERY_CONCURRENCY = 16
+# Seconds until discovery responds to HC with whatever has answered.
+DISCOVERY_DEADLINE = 5.0
+
 
 def discover_devices(command_content):
     """
     Sends a capability request to each unattached device that the HUME knows
     about, and then responds with the result to HC.
 
-    :param command_content: currently not in use, empty
-    :type command_content: str
-    """
-    LOGGER.debug(f"discover devices command content: {command_content}")
+    Capability requests are sent concurrently, at most DISCOVERY_CONCURRENCY
+    at a time, and discovery finishes after DISCOVERY_DEADLINE seconds at the
+    latest. Devices that have not answered by then are reported as timed out.
 
-    devices = hume_storage.get_all(Device)
-    result = []
+    Capabilities are served from the capability cache when possible, unless
+    "refresh" is set in the command content.
 
-    for device in devices:
-        if not device.attached:
+    In streaming mode, each answer is sent to HC as a partial result as soon
+    as it arrives, and discovery ends with a result marked as done containing
+    only the timed out devices. All results of a discovery carry the same
+    session ID.
 
-            device_capability = device_req_lib.capability_request(device)
-            if device_capability is not None:
-                result.append(device_capability)
+    :param command_content: optional dict with "concurrency", "deadline",
+                            "stream", "refresh" and "session_id" overriding
+                            the defaults
+    :type command_content: str | dict
+    """
+    LOGGER.debug(f"discover devices command content: {command_content}")
+
+    if not isinstance(command_content, dict):
+        command_content = {}
+
+    session_id = command_content.get("session_id", str(uuid.uuid4()))
+    stream = command_content.get("stream", False)
+
+    devices = [device for device in hume_storage.get_all(Device)
+               if not device.attached]
+
+    def partial_result(device_capability):
+        """
+        Forwards a single capability answer to HC.
+
+        :type device_capability: dict
+        """
+        dispatch.hc_command(
+            {
+                "type": defs.DISCOVER_DEVICES,
+                "content": [device_capability],
+                "session_id": session_id,
+                "done": False
+            }
+        )
+
+    result, timed_out = _capability_fan_out(
+        devices,
+        command_content.get("concurrency", DISCOVERY_CONCURRENCY),
+        command_content.get("deadline", DISCOVERY_DEADLINE),
+        on_result=partial_result if stream else None,
+        use_cache=not command_content.get("refresh", False)
+    )
 
     LOGGER.debug(f"the following devices responded: {result}")
+    LOGGER.debug(f"capability cache: {capability_cache.stats()}")
+    if timed_out:
+        LOGGER.warning(f"devices timed out during discovery: {timed_out}")
 
     dispatch.hc_command(
         {
             "type": defs.DISCOVER_DEVICES,
-            "content": result
+            # Already sent as partial results when streaming
+            "content": [] if stream else result,
+            "timed_out": timed_out,
+            "session_id": session_id,
+            "done": True
         }
     )
 
 
+def _capability_fan_out(devices,
+                        concurrency,
+                        deadline,
+                        on_result=None,
+                        use_cache=True):
+    """
+    Sends capability requests to the parameter devices concurrently. Devices
+    with a cached capability are not sent a request.
+
+    :param devices: devices to request capabilities from
+    :type devices: [Device]
+    :param concurrency: max number of requests in flight
+    :param deadline: seconds until giving up on devices that have not answered
+    :param on_result: called with each capability as soon as it arrives
+    :param use_cache: serve capabilities from the capability cache
+    :returns: list of device capabilities, list of timed out device UUIDs
+    """
+    result = []
+    uncached = []
+
+    for device in devices:
+        device_capability = \
+            capability_cache.get(device.uuid) if use_cache else None
+
+        if device_capability is None:
+            uncached.append(device)
+            continue
+
+        result.append(device_capability)
+
+        if on_result is not None:
+            on_result(device_capability)
+
+    devices = uncached
+
+    if not devices:
+        return result, []
+
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(devices)),
+                                  thread_name_prefix="discovery")
+    futures = {executor.submit(device_req_lib.capability_request, device):
+               device for device in devices}
+
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            try:
+                device_capability = future.result()
+            except Exception:
+                LOGGER.exception(f"capability request to "
+                                 f"{futures[future].uuid} failed")
+                continue
+
+            if device_capability is not None:
+                capability_cache.put(futures[future].uuid, device_capability)
+                result.append(device_capability)
+
+                if on_result is not None:
+                    on_result(device_capability)
+    except TimeoutError:
+        LOGGER.debug("discovery deadline reached")
+
+    timed_out = [device.uuid for future, device in futures.items()
+                 if not future.done()]
+
+    # Do not wait for stragglers, their results are no longer wanted.
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    return result, timed_out
+
+
 def confirm_attach(device_uuid):
     """
     :param device_uuid: device to attach
@@ -54,6 +181,11 @@ def confirm_attach(device_uuid):
         if device_req_lib.heartbeat_request(device):
             device.attached = True
             hume_storage.save(device)
+            liveness.track(device_uuid)
+            liveness.seen(device_uuid)
+            # Known from discovery, kept to tell read actions apart after a
+            # restart
+            capability_cache.persist(device_uuid)
 
             dispatch.hc_command(
                 {
@@ -66,6 +198,10 @@ def confirm_attach(device_uuid):
             LOGGER.warning("device did not respond to heartbeat request")
             # Remove, either the device info is faulty, or device has issues
             hume_storage.delete(device)
+            capability_cache.invalidate(device_uuid)
+            single_flight.invalidate(device_uuid)
+            liveness.forget(device_uuid)
+            address_versions.bump(device_uuid)
     else:
         LOGGER.error("device to be attached does not exist")
 
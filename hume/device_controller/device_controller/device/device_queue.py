@@ -0,0 +1,282 @@
+import collections
+import logging
+import threading
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module queues outbound requests per device so that discovery,
+heartbeats, timers and HINT actions hitting the same device at once do not
+overwhelm it. Each device has a FIFO queue, a cap on concurrent requests, one
+by default, and a token bucket rate limit set per device class. An identical
+idempotent request already waiting in a device's queue is not queued again,
+the caller waits for the queued request's response instead.
+
+Device classes are the "type" of the device's capabilities, devices with
+unknown capabilities use the DEFAULT_CLASS limits.
+"""
+
+
+DEFAULT_CLASS = "default"
+
+# Requests in flight per device at once.
+DEFAULT_CONCURRENCY = 1
+# Requests waiting per device, more are rejected.
+DEFAULT_MAX_QUEUED = 32
+
+# Token bucket, requests per second and burst size.
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 5
+
+# device class: (rate, burst)
+_class_limits = {DEFAULT_CLASS: (DEFAULT_RATE, DEFAULT_BURST)}
+
+# uuid: DeviceQueue
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+class _Request:
+    """
+    A queued request and the callers waiting for its response.
+    """
+
+    __slots__ = ("key", "done", "result", "callers")
+
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.result = None
+        self.callers = 1
+
+
+class DeviceQueue:
+    """
+    Outbound request queue of one device.
+    """
+
+    def __init__(self,
+                 rate=DEFAULT_RATE,
+                 burst=DEFAULT_BURST,
+                 concurrency=DEFAULT_CONCURRENCY,
+                 max_queued=DEFAULT_MAX_QUEUED):
+        """
+        :param rate: requests per second
+        :param burst: requests that can be sent at once after being idle
+        :param concurrency: requests in flight at once
+        :param max_queued: requests waiting at once, more are rejected
+        """
+        self.device_class = DEFAULT_CLASS
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        # request key: _Request, for coalescing identical queued requests
+        self._waiting = {}
+        self._active = 0
+
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+
+        self.sent = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def call(self, key, func):
+        """
+        Sends a request when it is its turn and the rate limit allows.
+
+        :param key: hashable identity of the request, identical requests
+                    waiting in the queue are coalesced, None to never
+                    coalesce
+        :param func: sends the request, returns the response
+        :returns: the response, shared with coalesced callers, None if the
+                  request was rejected because the queue is full
+        """
+        with self._condition:
+            queued = self._waiting.get(key) if key is not None else None
+
+            if queued is not None:
+                queued.callers += 1
+                self.coalesced += 1
+            elif len(self._queue) >= self.max_queued:
+                self.rejected += 1
+                return None
+            else:
+                request = _Request(key)
+                self._queue.append(request)
+                if key is not None:
+                    self._waiting[key] = request
+
+        if queued is not None:
+            queued.done.wait()
+            return queued.result
+
+        self._wait_turn(request)
+
+        try:
+            request.result = func()
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+            request.done.set()
+
+        return request.result
+
+    def _wait_turn(self, request):
+        """
+        Blocks until the request is first in the queue, a concurrency slot is
+        free and a token is available, then takes them.
+        """
+        with self._condition:
+            while True:
+                if self._queue[0] is request and \
+                        self._active < self.concurrency:
+                    wait = self._take_token()
+
+                    if wait == 0:
+                        break
+                else:
+                    wait = None
+
+                self._condition.wait(wait)
+
+            self._queue.popleft()
+            if request.key is not None:
+                del self._waiting[request.key]
+
+            self._active += 1
+            self.sent += 1
+            self._condition.notify_all()
+
+    def _take_token(self):
+        """
+        Must be called holding _condition.
+
+        :returns: 0 if a token was taken, else seconds until one is available
+        """
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._refilled) * self.rate,
+                           self.burst)
+        self._refilled = now
+
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+
+        return (1 - self._tokens) / self.rate
+
+    def stats(self):
+        """
+        :rtype: dict
+        """
+        return {"queued": len(self._queue),
+                "active": self._active,
+                "sent": self.sent,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected}
+
+
+def configure(class_limits):
+    """
+    Sets the rate limits of device classes.
+
+    :param class_limits: device class: (requests per second, burst), the
+                         DEFAULT_CLASS limits apply to other classes
+    """
+    with _queues_lock:
+        _class_limits.update(class_limits)
+        LOGGER.debug(f"device class rate limits: {_class_limits}")
+
+        # Limits of existing queues are looked up again when next used
+        for queue in _queues.values():
+            queue.device_class = None
+
+
+def parse_class_limit(limit):
+    """
+    Parses a device class rate limit argument, "CLASS=RATE" or
+    "CLASS=RATE:BURST".
+
+    :returns: (device class, (rate, burst))
+    :raises ValueError: if the limit is malformed
+    """
+    device_class, _, rate_burst = limit.partition("=")
+    rate, _, burst = rate_burst.partition(":")
+
+    rate = float(rate)
+    burst = int(burst) if burst else max(1, int(rate))
+
+    if not device_class or rate <= 0 or burst < 1:
+        raise ValueError(f"invalid device class rate limit: {limit}")
+
+    return device_class, (rate, burst)
+
+
+def device_class(device):
+    """
+    :type device: Device
+    :returns: rate limit class of the device
+    """
+    capability = device.capability
+
+    if capability is None or capability.get("type") is None:
+        return DEFAULT_CLASS
+
+    return str(capability["type"])
+
+
+def get_queue(device):
+    """
+    :type device: Device
+    :returns: the device's request queue, created on first use
+    :rtype: DeviceQueue
+    """
+    queue = _queues.get(device.uuid)
+    current_class = device_class(device)
+
+    if queue is None or queue.device_class != current_class:
+        with _queues_lock:
+            queue = _queues.get(device.uuid)
+
+            if queue is None:
+                queue = DeviceQueue()
+                _queues[device.uuid] = queue
+
+            # Class is known once the device's capabilities are
+            queue.device_class = current_class
+            queue.rate, queue.burst = _class_limits.get(
+                current_class, _class_limits[DEFAULT_CLASS]
+            )
+
+    return queue
+
+
+def call(device, key, func):
+    """
+    Sends a request through the device's queue, see DeviceQueue.call.
+
+    :type device: Device
+    """
+    return get_queue(device).call(key, func)
+
+
+def stats():
+    """
+    :returns: totals over all device queues
+    :rtype: dict
+    """
+    totals = collections.Counter()
+
+    for queue in list(_queues.values()):
+        totals.update(queue.stats())
+
+    return dict(totals, devices=len(_queues))
@@ -1,31 +1,204 @@
 import logging
+import time
 
 import hume_storage
 
 from device_controller.device.models import Device
+from device_controller.device import (
+    capability_cache,
+    address_versions,
+    device_health,
+    event_pipeline,
+    liveness
+)
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Fields of an attach message that are not part of the device's capability
+# document, for devices that include their document in the message.
+ATTACH_FIELDS = ("ip_address", "capability_fingerprint")
+
 
 """
 This module specifies the handling of device messages.
 """
 
 
+# Called with the UUID, sub-device ID and event ID of each accepted device
+# event, set by the config application to run local triggers.
+_event_hook = None
+
+
+def set_event_hook(hook):
+    """
+    :param hook: called with (uuid, device_id, event_id) of each accepted
+                 device event, None to remove the hook
+    """
+    global _event_hook
+    _event_hook = hook
+
+
 def attach(request_content):
     """
     :param dict request_content: incoming device message
     """
-    device = hume_storage.get(Device, request_content["uuid"])
+    attach_many([request_content])
+
+
+def is_valid_attach(record):
+    """
+    :param record: attach message
+    :returns: True if the message has a device UUID and an IP address
+    """
+    return isinstance(record, dict) and \
+        isinstance(record.get("uuid"), str) and record["uuid"] != "" and \
+        isinstance(record.get("ip_address"), str)
+
+
+def attach_many(records):
+    """
+    Handles the attach messages of many devices in one storage transaction.
+    Only the latest message of a device is kept if it sent several. Devices
+    that include their capability document in the message, as simulated
+    devices do, have it registered and persisted. Invalid messages are
+    skipped, so they do not fail the attaches of other devices.
+
+    :param records: incoming device messages
+    :type records: [dict]
+    """
+    latest = {}
+    for record in records:
+        if not is_valid_attach(record):
+            LOGGER.warning(f"skipping invalid attach message: {record}")
+            continue
+
+        latest[record["uuid"]] = record
+
+    new = []
+    # (device, previous IP address)
+    moved = []
+
+    # hume_storage.save updates the storage cache as the devices are written,
+    # so the cache is restored if the transaction is rolled back. Address
+    # versions and device health are only updated once it has been committed.
+    try:
+        with Device._meta.database.atomic():
+            for uuid, request_content in latest.items():
+                ip_address = request_content["ip_address"]
+                device = hume_storage.get(Device, uuid)
+
+                if device is None:
+                    LOGGER.debug("new device")
+                    device = Device(uuid=uuid, ip_address=ip_address)
+                    new.append(device)
+
+                # If exists, device has rebooted, save new IP
+                elif device.ip_address != ip_address:
+                    LOGGER.debug("device exists, new IP")
+                    moved.append((device, device.ip_address))
+                    device.ip_address = ip_address
+
+                else:
+                    continue
+
+                hume_storage.save(device)
+    except Exception:
+        _restore_cache(new, moved)
+        raise
+
+    for device in new:
+        address_versions.bump(device.uuid)
+
+    for device, _ip_address in moved:
+        address_versions.bump(device.uuid)
+        device_health.reset(device.uuid)
+
+    for uuid, request_content in latest.items():
+        liveness.seen(uuid)
+
+        # A changed fingerprint means the device's capabilities have changed
+        capability_cache.attached(
+            uuid, request_content.get("capability_fingerprint")
+        )
+
+        if "actions" in request_content or "devices" in request_content:
+            capability_cache.persist(
+                uuid,
+                {field: value for field, value in request_content.items()
+                 if field not in ATTACH_FIELDS}
+            )
+
+
+def _restore_cache(new, moved):
+    """
+    Restores the storage cache after a rolled back attach transaction. The
+    rows of new devices were rolled back, deleting them only evicts them from
+    the cache.
+
+    :param new: devices that were new
+    :param moved: (device, previous IP address) of devices with a new address
+    """
+    for device, ip_address in moved:
+        device.ip_address = ip_address
+
+    for device in new:
+        hume_storage.delete(device)
+
+
+def device_event(uuid, event_id, content):
+    """
+    Handles an event that occurred on a device.
+
+    :param uuid: device UUID
+    :param event_id: event ID
+    :param content: event content
+    :returns: True if the event was accepted
+    """
+    return _event(uuid, None, event_id, content)
+
+
+def sub_device_event(uuid, device_id, event_id, content):
+    """
+    Handles an event that occurred on a sub-device.
+
+    :param uuid: UUID of the parent device
+    :param device_id: ID of the sub-device
+    :param event_id: event ID
+    :param content: event content
+    :returns: True if the event was accepted
+    """
+    return _event(uuid, device_id, event_id, content)
+
+
+def _event(uuid, device_id, event_id, content):
+    """
+    Validates a device event, runs its local triggers and queues it for
+    forwarding to the HC. Events from unknown devices are rejected. Attached
+    devices are found in the liveness table, so only events from devices that
+    are not attached yet hit storage.
+
+    :returns: True if the event was accepted
+    """
+    if not liveness.is_attached(uuid) and \
+            hume_storage.get(Device, uuid) is None:
+        LOGGER.warning(f"event from unknown device: {uuid}")
+        return False
+
+    # bool is a subclass of int
+    if type(event_id) is not int or \
+            (device_id is not None and type(device_id) is not int):
+        LOGGER.warning(f"malformed event from device {uuid}: "
+                       f"{device_id},{event_id}")
+        return False
+
+    liveness.seen(uuid)
 
-    # If exists, device has rebooted, save new IP
-    if device:
-        LOGGER.debug("device exists")
-        device.ip_address = request_content["ip_address"]
-    else:
-        LOGGER.debug("new device")
-        device = Device(uuid=request_content["uuid"],
-                        ip_address=request_content["ip_address"])
+    if _event_hook is not None:
+        _event_hook(uuid, device_id, event_id)
 
-    hume_storage.save(device)
+    return event_pipeline.put({"uuid": uuid,
+                               "device_id": device_id,
+                               "event_id": event_id,
+                               "content": content,
+                               "timestamp": time.time()})
@@ -1,6 +1,13 @@
 import logging
-import requests
-
+import time
+
+from device_controller.device import (
+    device_client,
+    device_health,
+    device_queue,
+    liveness,
+    single_flight
+)
 from device_controller.util.args import get_arg, TEST_DEVICE_MOCK_ADDRESS
 
 
@@ -26,6 +33,72 @@ def _device_url(device):
     return f"http://{device.ip_address}:32222/"
 
 
+def _request(device, method, path, coalesce=False, **kwargs):
+    """
+    Sends a request through the device's outbound queue. Identical idempotent
+    requests waiting in the queue are coalesced into one, other requests are
+    always sent since executing them twice may be intended. Responding
+    devices are marked as alive.
+
+    The read timeout adapts to the device's round trip times, and requests to
+    a device with an open circuit fail without being sent.
+
+    :type device: Device
+    :param method: HTTP method
+    :param path: path relative to the device URL
+    :param coalesce: True if the request is idempotent, such as a
+                     capability request or a read action
+    :param kwargs: passed on to device_client.request
+    :rtype: requests.Response | None
+    """
+    key = (method, path) if coalesce else None
+    url = _device_url(device) + path
+    health = device_health.get(device.uuid)
+
+    def send():
+        """
+        Sends the request when it is its turn in the queue.
+        """
+        if not health.allow():
+            LOGGER.debug(f"circuit open, not sending {method} {url}")
+            return None
+
+        start = time.monotonic()
+        response = device_client.request(
+            method,
+            url,
+            timeout=health.timeout(device_client.timeouts()),
+            **kwargs
+        )
+
+        if response is None:
+            if health.failure():
+                LOGGER.warning(f"device {device.uuid} keeps failing, "
+                               f"opening its circuit")
+        else:
+            health.success(time.monotonic() - start)
+
+        return response
+
+    response = device_queue.call(device, key, send)
+
+    # Any response shows that the device is alive
+    if response is not None:
+        liveness.seen(device.uuid)
+
+    return response
+
+
+def latency_profile(device):
+    """
+    :type device: Device
+    :returns: round trip time statistics, read timeout and circuit state of
+              the device
+    :rtype: dict
+    """
+    return device_health.get(device.uuid).profile(device_client.timeouts())
+
+
 def capability_request(device):
     """
     Sends a capability request to the parameter device, expecting information
@@ -63,9 +136,9 @@ def capability_request(device):
     #     ]
     # }
 
-    response = requests.get(_device_url(device) + "capabilities")
+    response = _request(device, "GET", "capabilities", coalesce=True)
 
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         return response.json()
 
     return None
@@ -78,9 +151,78 @@ def heartbeat_request(device):
     :type device: Device
     :returns: True if successful
     """
-    response = requests.get(_device_url(device) + "heartbeat")
+    response = _request(device, "GET", "heartbeat", coalesce=True)
 
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         return True
 
     return False
+
+
+def device_action(device, action_id):
+    """
+    Sends an action request to the parameter device.
+
+    :type device: Device
+    :param action_id: ID of the action to execute
+    :returns: None or action result as a dictionary
+    """
+    response = _request(
+        device,
+        "GET",
+        f"actions/{action_id}",
+        coalesce=single_flight.is_read_action(device, None, action_id)
+    )
+
+    if response is not None and response.status_code == 200:
+        return response.json() if response.content else {}
+
+    return None
+
+
+def sub_device_action(device, device_id, action_id):
+    """
+    Sends an action request to a sub-device of the parameter device.
+
+    :type device: Device
+    :param device_id: ID of the sub-device
+    :param action_id: ID of the action to execute
+    :returns: None or action result as a dictionary
+    """
+    response = _request(
+        device,
+        "GET",
+        f"devices/{device_id}/actions/{action_id}",
+        coalesce=single_flight.is_read_action(device, device_id, action_id)
+    )
+
+    if response is not None and response.status_code == 200:
+        return response.json() if response.content else {}
+
+    return None
+
+
+def batch_action(device, actions):
+    """
+    Sends several actions to the parameter device in one request.
+
+    :type device: Device
+    :param actions: (device_id, action_id) pairs, device_id is None for
+                    actions on the device itself
+    :returns: None or a list of action results, in the order of the actions
+    """
+    response = _request(
+        device,
+        "POST",
+        "actions",
+        json={"actions": [{"device_id": device_id, "action_id": action_id}
+                          for device_id, action_id in actions]}
+    )
+
+    if response is not None and response.status_code == 200:
+        results = response.json().get("results")
+
+        if isinstance(results, list) and len(results) == len(actions):
+            return results
+
+    return None
@@ -0,0 +1,211 @@
+import logging
+import queue
+import threading
+import time
+
+from device_controller import dispatch
+from device_controller import defs
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module forwards device events to the HC in batches. Events are put on a
+bounded queue without blocking, a full queue drops the event instead of
+holding up the device request that carried it, and a single forwarding
+thread takes them off the queue and sends them to the HC in micro-batches of
+up to BATCH_SIZE events, or whatever arrived within LINGER seconds of the
+first event of a batch. The broker is only ever called from the forwarding
+thread, so ingestion never waits for it.
+
+Each batch is sent to the HC as one DEVICE_EVENTS command.
+"""
+
+
+DEFAULT_QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+# Seconds to wait for more events before sending a batch.
+LINGER = 0.05
+
+
+class EventPipeline:
+    """
+    Bounded queue of device events with a micro-batching forwarder.
+    """
+
+    def __init__(self,
+                 send,
+                 queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_size=BATCH_SIZE,
+                 linger=LINGER):
+        """
+        :param send: called with a list of events to forward, on the
+                     forwarding thread
+        :param queue_size: max number of queued events, more are dropped
+        :param batch_size: max number of events per batch
+        :param linger: seconds to wait for more events before sending a
+                       batch
+        """
+        self.send = send
+        self.batch_size = batch_size
+        self.linger = linger
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+        self.received = 0
+        self.dropped = 0
+        self.forwarded = 0
+        self.batches = 0
+
+    def start(self):
+        """
+        Starts the forwarding thread.
+        """
+        self._thread = threading.Thread(target=self._run,
+                                        name="event-pipeline",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Forwards the queued events and stops the forwarding thread.
+        """
+        if self._thread is None:
+            return
+
+        # Blocks until there is room, the forwarder is still draining
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def put(self, event):
+        """
+        Queues an event for forwarding, never blocks.
+
+        :param event: event dict
+        :returns: False if the queue was full and the event was dropped
+        """
+        self.received += 1
+
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        return True
+
+    def _run(self):
+        """
+        Forwarding thread loop, sends queued events in batches.
+        """
+        stopping = False
+
+        while not stopping:
+            event = self._queue.get()
+
+            if event is None:
+                break
+
+            batch = [event]
+            deadline = time.monotonic() + self.linger
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+
+                try:
+                    if timeout > 0:
+                        event = self._queue.get(timeout=timeout)
+                    else:
+                        event = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if event is None:
+                    stopping = True
+                    break
+
+                batch.append(event)
+
+            self._send(batch)
+
+    def _send(self, batch):
+        """
+        Sends a batch, dropping it if sending fails.
+        """
+        try:
+            self.send(batch)
+        except Exception:
+            LOGGER.exception(f"failed to forward {len(batch)} device events")
+            self.dropped += len(batch)
+            return
+
+        self.forwarded += len(batch)
+        self.batches += 1
+
+    def stats(self):
+        """
+        :returns: number of events received, dropped, forwarded, batches sent
+                  and currently queued
+        :rtype: dict
+        """
+        return {"received": self.received,
+                "dropped": self.dropped,
+                "forwarded": self.forwarded,
+                "batches": self.batches,
+                "queued": self._queue.qsize()}
+
+
+def _forward(events):
+    """
+    Sends a batch of device events to the HC.
+
+    :type events: [dict]
+    """
+    dispatch.hc_command(
+        {
+            "type": defs.DEVICE_EVENTS,
+            "content": events
+        }
+    )
+
+
+_pipeline = EventPipeline(_forward)
+
+
+def start(queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Starts forwarding device events to the HC.
+
+    :param queue_size: max number of queued events, more are dropped
+    """
+    global _pipeline
+    _pipeline = EventPipeline(_forward, queue_size=queue_size)
+    _pipeline.start()
+
+
+def stop():
+    """
+    Forwards the queued device events and stops forwarding.
+    """
+    _pipeline.stop()
+
+
+def put(event):
+    """
+    Queues a device event for forwarding to the HC, never blocks.
+
+    :param event: event dict
+    :returns: False if the event was dropped
+    """
+    return _pipeline.put(event)
+
+
+def stats():
+    """
+    :returns: event pipeline statistics
+    :rtype: dict
+    """
+    return _pipeline.stats()
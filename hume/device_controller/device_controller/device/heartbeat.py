@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+
+import hume_storage
+
+from device_controller.config.scheduler import Scheduler
+from device_controller.device import device_req_lib, liveness
+from device_controller.device.models import Device
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module sends heartbeats to attached devices to keep their liveness up to
+date. The liveness table is split into batches by slot, and one batch is
+looked at per tick so that heartbeats are spread evenly over the heartbeat
+interval instead of sent all at once.
+
+Devices with traffic seen within the interval are skipped, that traffic
+already shows they are alive, so heartbeats are only sent to idle devices.
+Devices that missed a heartbeat are probed again on the next tick instead of
+waiting a whole interval, until they are considered dead.
+"""
+
+
+DEFAULT_INTERVAL = 60.0
+DEFAULT_BATCHES = 12
+
+# Heartbeats sent at once.
+PROBE_WORKERS = 4
+
+
+class HeartbeatScheduler:
+    """
+    Sends batched heartbeats to idle devices in a liveness table.
+    """
+
+    def __init__(self,
+                 table,
+                 interval=DEFAULT_INTERVAL,
+                 batches=DEFAULT_BATCHES,
+                 probe=None):
+        """
+        :param table: devices to send heartbeats to
+        :type table: liveness.LivenessTable
+        :param interval: seconds between heartbeats to an idle device
+        :param batches: number of ticks per interval
+        :param probe: called with a device UUID, returns True if the device
+                      responded, defaults to a heartbeat request
+        """
+        self.table = table
+        self.interval = interval
+        self.batches = batches
+        self.probe = probe or _heartbeat
+
+        self._scheduler = Scheduler(workers=PROBE_WORKERS, name="heartbeat")
+        self._lock = threading.Lock()
+        self._tick = 0
+        self._probing = set()
+        # Slots of devices that missed their last heartbeat
+        self._retry = set()
+
+        self.probes = 0
+        self.skipped = 0
+        self.failures = 0
+
+    def start(self):
+        """
+        Starts sending heartbeats.
+        """
+        tick = self.interval / self.batches
+
+        self._scheduler.start()
+        self._scheduler.schedule("tick", tick, self._on_tick, interval=tick)
+
+    def stop(self):
+        """
+        Stops sending heartbeats.
+        """
+        self._scheduler.stop()
+
+    def _on_tick(self, now=None):
+        """
+        Sends heartbeats to the idle devices of the next batch and to the
+        devices that missed their last heartbeat.
+        """
+        now = time.monotonic() if now is None else now
+        table = self.table
+
+        with self._lock:
+            batch = self._tick % self.batches
+            self._tick += 1
+            retry, self._retry = self._retry, set()
+
+        slots = retry.union(range(batch, len(table), self.batches))
+
+        for slot in slots:
+            uuid = table.uuids[slot]
+
+            if uuid is None:
+                continue
+
+            if slot not in retry and \
+                    now - table.last_seen[slot] < self.interval:
+                self.skipped += 1
+                continue
+
+            with self._lock:
+                if uuid in self._probing:
+                    continue
+                self._probing.add(uuid)
+
+            self.probes += 1
+            self._scheduler.schedule(("probe", uuid), 0, self._probe, slot,
+                                     uuid)
+
+    def _probe(self, slot, uuid):
+        """
+        Sends a heartbeat to a device and updates its liveness.
+        """
+        try:
+            alive = self.probe(uuid)
+        except Exception:
+            LOGGER.exception(f"heartbeat to device {uuid} failed")
+            alive = False
+        finally:
+            with self._lock:
+                self._probing.discard(uuid)
+
+        # The device may have been forgotten meanwhile
+        if self.table.uuids[slot] != uuid:
+            return
+
+        if alive:
+            self.table.seen(uuid)
+            return
+
+        self.failures += 1
+        previous = self.table.states[slot]
+
+        if self.table.missed(slot) == liveness.DEAD:
+            if previous != liveness.DEAD:
+                LOGGER.warning(f"device {uuid} is not responding")
+        else:
+            with self._lock:
+                self._retry.add(slot)
+
+    def stats(self):
+        """
+        :returns: number of heartbeats sent, skipped thanks to recent traffic
+                  and failed, and devices per liveness state
+        :rtype: dict
+        """
+        return {"probes": self.probes,
+                "skipped": self.skipped,
+                "failures": self.failures,
+                **self.table.counts()}
+
+
+def _heartbeat(uuid):
+    """
+    :param uuid: device UUID
+    :returns: True if the device responded to a heartbeat request
+    """
+    device = hume_storage.get(Device, uuid)
+
+    if device is None:
+        return False
+
+    return device_req_lib.heartbeat_request(device)
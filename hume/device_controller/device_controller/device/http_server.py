@@ -1,6 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer
+
 from bottle import WSGIRefServer
 
 
+# Server modes, selectable at startup.
+SERVER_MODE_SINGLE = "single"
+SERVER_MODE_THREADED = "threaded"
+
+SERVER_MODES = [SERVER_MODE_SINGLE, SERVER_MODE_THREADED]
+
+DEFAULT_SERVER_WORKERS = 16
+
+
+class ThreadPoolWSGIServer(WSGIServer):
+    """
+    WSGI server handing each accepted connection to a bounded pool of worker
+    threads, so that a slow device request does not stall the accept loop or
+    other devices. Connections that arrive while all workers are busy are
+    queued by the pool.
+    """
+
+    max_workers = DEFAULT_SERVER_WORKERS
+    # Listen backlog, the socketserver default of 5 refuses connections when
+    # many devices attach at the same time.
+    request_queue_size = 128
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="device-http"
+        )
+
+    def process_request(self, request, client_address):
+        """
+        Overrides socketserver.BaseServer to process the request in the pool.
+        """
+        self._executor.submit(self._process_request_worker,
+                              request,
+                              client_address)
+
+    def _process_request_worker(self, request, client_address):
+        """
+        Same as socketserver.BaseServer.process_request, but in a worker.
+        """
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def shutdown(self):
+        """
+        Stops the serve_forever loop and waits for in-flight requests.
+        """
+        super().shutdown()
+        self._executor.shutdown(wait=True)
+
+
+def pooled_server_class(max_workers):
+    """
+    Returns a ThreadPoolWSGIServer class using the parameter number of workers.
+
+    :param max_workers: max number of concurrently handled requests
+    :type max_workers: int
+    """
+    class PooledServer(ThreadPoolWSGIServer):
+        pass
+
+    PooledServer.max_workers = max_workers
+
+    return PooledServer
+
+
+def create_server(host, port, mode=SERVER_MODE_SINGLE, workers=None):
+    """
+    Creates a server for the parameter mode.
+
+    :param host: host to listen on
+    :param port: port to listen on
+    :param mode: one of SERVER_MODES
+    :param workers: number of worker threads, only used in threaded mode
+    :rtype: MyServer
+    """
+    if mode == SERVER_MODE_THREADED:
+        return MyServer(host=host,
+                        port=port,
+                        server_class=pooled_server_class(
+                            workers or DEFAULT_SERVER_WORKERS
+                        ))
+
+    return MyServer(host=host, port=port)
+
+
 class MyServer(WSGIRefServer):
     """
     Thanks SO user Sepero for this one:
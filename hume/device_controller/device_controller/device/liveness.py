@@ -0,0 +1,209 @@
+import array
+import logging
+import threading
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module keeps the liveness of all attached devices in a table of arrays,
+one slot per device: when traffic was last seen from the device, its state
+and its number of missed heartbeats. Slots are found by a dict lookup, so
+liveness queries and updates are O(1), and slots of forgotten devices are
+reused.
+
+Any successful request to a device, or request from it, marks it as seen, so
+devices with recent traffic do not need to be sent heartbeats.
+"""
+
+
+# Device states
+UNKNOWN = 0  # Tracked but not seen yet
+ALIVE = 1
+SUSPECT = 2  # Missed a heartbeat
+DEAD = 3  # Missed MAX_MISSES heartbeats in a row
+
+STATE_NAMES = ("unknown", "alive", "suspect", "dead")
+
+MAX_MISSES = 3
+
+
+class LivenessTable:
+    """
+    Array-backed liveness of tracked devices.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # uuid: slot
+        self._slots = {}
+        self._free = []
+
+        self.uuids = []  # slot: uuid, None if free
+        self.last_seen = array.array("d")  # slot: monotonic time
+        self.states = array.array("B")  # slot: state
+        self.misses = array.array("B")  # slot: missed heartbeats in a row
+
+    def track(self, uuid):
+        """
+        Starts tracking a device, does nothing if already tracked.
+
+        :param uuid: device UUID
+        :returns: slot of the device
+        """
+        with self._lock:
+            slot = self._slots.get(uuid)
+
+            if slot is not None:
+                return slot
+
+            if self._free:
+                slot = self._free.pop()
+                self.uuids[slot] = uuid
+                self.last_seen[slot] = 0.0
+                self.states[slot] = UNKNOWN
+                self.misses[slot] = 0
+            else:
+                slot = len(self.uuids)
+                self.uuids.append(uuid)
+                self.last_seen.append(0.0)
+                self.states.append(UNKNOWN)
+                self.misses.append(0)
+
+            self._slots[uuid] = slot
+
+            return slot
+
+    def forget(self, uuid):
+        """
+        Stops tracking a device.
+
+        :param uuid: device UUID
+        """
+        with self._lock:
+            slot = self._slots.pop(uuid, None)
+
+            if slot is not None:
+                self.uuids[slot] = None
+                self._free.append(slot)
+
+    def seen(self, uuid, now=None):
+        """
+        Marks a tracked device as alive, traffic was seen from it.
+
+        :param uuid: device UUID
+        :param now: monotonic time the traffic was seen, defaults to now
+        """
+        slot = self._slots.get(uuid)
+
+        if slot is not None:
+            self.last_seen[slot] = time.monotonic() if now is None else now
+            self.states[slot] = ALIVE
+            self.misses[slot] = 0
+
+    def missed(self, slot):
+        """
+        Records a missed heartbeat of the device in a slot.
+
+        :returns: the device's new state
+        """
+        misses = min(self.misses[slot] + 1, MAX_MISSES)
+        self.misses[slot] = misses
+        self.states[slot] = DEAD if misses >= MAX_MISSES else SUSPECT
+
+        return self.states[slot]
+
+    def state(self, uuid):
+        """
+        :param uuid: device UUID
+        :returns: state of the device, None if not tracked
+        """
+        slot = self._slots.get(uuid)
+
+        return None if slot is None else self.states[slot]
+
+    def seconds_since_seen(self, uuid):
+        """
+        :param uuid: device UUID
+        :returns: seconds since traffic was last seen from the device, None
+                  if not tracked or never seen
+        """
+        slot = self._slots.get(uuid)
+
+        if slot is None or self.states[slot] == UNKNOWN:
+            return None
+
+        return time.monotonic() - self.last_seen[slot]
+
+    def is_alive(self, uuid):
+        """
+        :param uuid: device UUID
+        :returns: True if the device is tracked and not dead
+        """
+        state = self.state(uuid)
+
+        return state is not None and state != DEAD
+
+    def counts(self):
+        """
+        :returns: number of tracked devices per state name
+        :rtype: dict
+        """
+        counts = dict.fromkeys(STATE_NAMES, 0)
+
+        with self._lock:
+            for slot in self._slots.values():
+                counts[STATE_NAMES[self.states[slot]]] += 1
+
+        return counts
+
+    def __len__(self):
+        return len(self.uuids)
+
+
+_table = LivenessTable()
+
+
+def get_table():
+    """
+    :returns: liveness table of all attached devices
+    :rtype: LivenessTable
+    """
+    return _table
+
+
+def track(uuid):
+    """
+    Starts tracking the liveness of a device, when it is attached.
+    """
+    _table.track(uuid)
+
+
+def forget(uuid):
+    """
+    Stops tracking the liveness of a device.
+    """
+    _table.forget(uuid)
+
+
+def seen(uuid):
+    """
+    Marks a device as alive, called on any traffic from it.
+    """
+    _table.seen(uuid)
+
+
+def is_attached(uuid):
+    """
+    :returns: True if the device is attached
+    """
+    return _table.state(uuid) is not None
+
+
+def is_alive(uuid):
+    """
+    :returns: True if the device is attached and not dead
+    """
+    return _table.is_alive(uuid)
@@ -1,7 +1,13 @@
+import json
+
 import peewee
 
+import hume_storage
+
 from hume_storage import PersistentModel
 
+from device_controller.device import capability_registry
+
 
 class Device(PersistentModel):
 
@@ -23,6 +29,43 @@ class Device(PersistentModel):
         """
         return "uuid"
 
+    @property
+    def capability(self):
+        """
+        :return: capability document shared by all devices of this device's
+                 model, or None if not known. Loaded from the persisted
+                 capability if not registered in this process yet, as after
+                 a restart.
+        """
+        capability = capability_registry.get(self.uuid)
+
+        if capability is None:
+            stored = hume_storage.get(DeviceCapability, self.uuid)
+
+            if stored is not None:
+                capability = capability_registry.register(
+                    self.uuid, json.loads(stored.document)
+                )
+
+        return capability
+
+
+class DeviceCapability(PersistentModel):
+    """
+    Capability document of an attached device, kept so that capabilities are
+    known without asking the device again after a restart.
+    """
+
+    uuid = peewee.CharField(unique=True)
+    document = peewee.TextField()  # JSON
+
+    @staticmethod
+    def local_key_field():
+        """
+        :return: name of local dict key field
+        """
+        return "uuid"
+
 
 # class DeviceStatus:
 #
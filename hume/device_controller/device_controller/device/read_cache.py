@@ -0,0 +1,96 @@
+import collections
+import logging
+import threading
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module caches the latest result of read actions per (device, sub-device,
+action). Callers state how stale a result they accept and are answered from
+the cache if the cached result is fresh enough, so dashboards refreshing the
+same sensors do not each cause a device request. Memory is bounded, least
+recently used results are evicted.
+"""
+
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class ReadCache:
+    """
+    LRU cache of read results with their read times.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        :param max_entries: max number of cached results
+        """
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        # key: (monotonic read time, result), least recently used first
+        self._entries = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, max_age):
+        """
+        :param key: (uuid, device_id, action_id)
+        :param max_age: seconds old a result may be
+        :returns: cached result if at most max_age seconds old, else None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or time.monotonic() - entry[0] > max_age:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+    def put(self, key, result, read_at=None):
+        """
+        :param key: (uuid, device_id, action_id)
+        :param result: read result
+        :param read_at: monotonic time the result was read, defaults to now
+        """
+        with self._lock:
+            self._entries[key] = (read_at or time.monotonic(), result)
+            self._entries.move_to_end(key)
+
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, uuid):
+        """
+        Drops all cached results of a device.
+
+        :param uuid: device UUID
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == uuid]:
+                del self._entries[key]
+
+    def stats(self):
+        """
+        :returns: hits, misses, hit rate, evictions and number of cached
+                  results
+        :rtype: dict
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions,
+                    "size": len(self._entries)}
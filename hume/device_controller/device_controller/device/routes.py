@@ -1,7 +1,7 @@
 import logging
 
-from bottle import request, post
-from device_controller.device import device_req_handler
+from bottle import request, response, post
+from device_controller.device import attach_admission, device_req_handler
 
 
 LOGGER = logging.getLogger(__name__)
@@ -10,11 +10,137 @@ LOGGER = logging.getLogger(__name__)
 @post('/devices/attach')
 def attach():
     """
-    A device sends an attach message to HUME.
+    A device sends an attach message to HUME. Answered with 400 if the
+    message has no uuid, and with 503 and a Retry-After header when too many
+    devices are attaching at once.
     """
     LOGGER.info("device attach received")
 
-    request.json["ip_address"] = request.environ.get("REMOTE_ADDR")
-    LOGGER.debug(f"device attach request content: {request.json}")
+    record = request.json
 
-    device_req_handler.attach(request.json)
+    if isinstance(record, dict):
+        record["ip_address"] = request.environ.get("REMOTE_ADDR")
+
+    if not device_req_handler.is_valid_attach(record):
+        response.status = 400
+        return {"error": "expected an attach message with a uuid"}
+
+    LOGGER.debug(f"device attach request content: {record}")
+
+    _admit([record])
+
+
+@post('/devices/attach/batch')
+def attach_batch():
+    """
+    Attach messages of many devices at once, {"devices": [message, ...]}.
+    Messages without an "ip_address" get the sender's address. Answered with
+    400 if a message has no uuid or a malformed ip_address, with 413 if there
+    are more messages than can be admitted at once, the sender should split
+    them, and with 503 and a Retry-After header when too many devices are
+    attaching at once.
+
+    :returns: number of attached devices
+    """
+    content = request.json
+    records = content.get("devices") if isinstance(content, dict) else None
+
+    if not isinstance(records, list):
+        response.status = 400
+        return {"error": "expected a list of attach messages"}
+
+    for record in records:
+        if isinstance(record, dict):
+            record.setdefault("ip_address",
+                              request.environ.get("REMOTE_ADDR"))
+
+    if not all(device_req_handler.is_valid_attach(record)
+               for record in records):
+        response.status = 400
+        return {"error": "expected attach messages with a uuid and an "
+                         "ip_address"}
+
+    if len(records) > attach_admission.max_batch():
+        response.status = 413
+        return {"error": f"at most {attach_admission.max_batch()} attach "
+                         f"messages per batch"}
+
+    LOGGER.info(f"batch attach of {len(records)} devices received")
+
+    if _admit(records):
+        return {"attached": len(records)}
+
+
+def _admit(records):
+    """
+    Admits attach messages, setting a 503 response if they were refused.
+
+    :returns: True if the attaches were written
+    """
+    retry_after = attach_admission.submit(records)
+
+    if retry_after is None:
+        return True
+
+    LOGGER.debug(f"attach refused, retry after {retry_after}s")
+
+    response.status = 503
+    response.set_header("Retry-After", str(retry_after))
+
+    return False
+
+
+@post('/devices/events')
+def events():
+    """
+    A device sends one or more events to HUME, either a single event or
+    {"events": [event, ...]}. An event is {"uuid", "event_id", "content"} and
+    also "device_id" if it occurred on a sub-device.
+
+    :returns: number of accepted and rejected events
+    """
+    content = request.json
+
+    if not isinstance(content, dict):
+        response.status = 400
+        return {"error": "expected a JSON object"}
+
+    events = content.get("events", [content])
+
+    if not isinstance(events, list):
+        response.status = 400
+        return {"error": "expected a list of events"}
+
+    accepted = 0
+    rejected = 0
+
+    for event in events:
+        try:
+            uuid = event["uuid"]
+            event_id = event["event_id"]
+        except (KeyError, TypeError):
+            rejected += 1
+            continue
+
+        if not isinstance(uuid, str):
+            rejected += 1
+            continue
+
+        device_id = event.get("device_id")
+
+        if device_id is None:
+            ok = device_req_handler.device_event(uuid,
+                                                 event_id,
+                                                 event.get("content"))
+        else:
+            ok = device_req_handler.sub_device_event(uuid,
+                                                     device_id,
+                                                     event_id,
+                                                     event.get("content"))
+
+        if ok:
+            accepted += 1
+        else:
+            rejected += 1
+
+    return {"accepted": accepted, "rejected": rejected}
@@ -4,7 +4,7 @@ import requests
 import json
 import random
 
-from bottle import run, get, response
+from bottle import run, get, post, request, response
 
 from device_controller.device.http_server import MyServer
 
@@ -114,6 +114,31 @@ def action(action_id):
     :param action_id: points out which action to execute
     :return: bottle.response
     """
+    response.body = json.dumps(_action_result(action_id))
+
+    return response
+
+
+@post('/actions')
+def batch_action():
+    """
+    HUME wants to execute several device actions at once.
+
+    :return: bottle.response
+    """
+    results = [_action_result(str(action["action_id"]))
+               for action in request.json["actions"]]
+
+    response.body = json.dumps({"results": results})
+
+    return response
+
+
+def _action_result(action_id):
+    """
+    :param action_id: points out which action to execute
+    :return: action result
+    """
     # both actions return a float, but humidity is a range between 0.0 and
     # 100.0 while temperature is assumed to be indoor and between 19.0 and
     # 30.0 degrees celsius.
@@ -122,6 +147,4 @@ def action(action_id):
     elif action_id == ACTION_HUMIDITY:
         val = random.uniform(0.0, 100.0)
 
-    response.body = json.dumps({"value": f"{val:.2f}"})
-
-    return response
+    return {"value": f"{val:.2f}"}
@@ -0,0 +1,265 @@
+import logging
+import threading
+import time
+
+from device_controller import settings
+from device_controller.device.read_cache import ReadCache
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+"""
+This module makes concurrent identical read actions share one device request.
+If HINT asks for a reading while a timer is already reading the same action
+on the same device, the second caller waits for the request in flight and
+gets its result instead of sending its own.
+
+Only actions that return a value according to the device's capabilities are
+shared, other actions, and actions of devices with unknown capabilities, are
+always sent since executing them twice may be intended. Read results are
+also kept in a read cache, callers passing a max_age are answered from it if
+the cached result is fresh enough.
+"""
+
+
+class _Call:
+    """
+    A device request in flight and its result.
+    """
+
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time, sharing its result with
+    concurrent callers of the same key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key: _Call
+        self._calls = {}
+
+        self.calls = 0
+        self.executions = 0
+
+    def do(self, key, func, *args):
+        """
+        :param key: hashable call identity
+        :param func: called with args unless a call with the key is in flight
+        :returns: result of func, possibly from another caller's call
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            call.done.wait()
+            return call.result
+
+        try:
+            call.result = func(*args)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        """
+        :returns: number of calls, of executions and the share of calls that
+                  were deduplicated
+        :rtype: dict
+        """
+        with self._lock:
+            calls, executions = self.calls, self.executions
+
+        return {"calls": calls,
+                "executions": executions,
+                "dedupe_ratio": 1 - executions / calls if calls else 0.0}
+
+
+_flight = SingleFlight()
+_cache = ReadCache()
+
+
+def device_action(device, action_id, max_age=None):
+    """
+    Executes an action on a device, sharing the request with concurrent
+    identical read actions.
+
+    :type device: Device
+    :param action_id: ID of the action to execute
+    :param max_age: seconds old a cached read result may be, None to always
+                    read from the device
+    :returns: None or action result as a dictionary
+    """
+    req_mod = settings.device_req_mod()
+
+    if not is_read_action(device, None, action_id):
+        return req_mod.device_action(device, action_id)
+
+    return _read(_key(device, None, action_id),
+                 max_age,
+                 req_mod.device_action,
+                 device,
+                 action_id)
+
+
+def sub_device_action(device, device_id, action_id, max_age=None):
+    """
+    Executes an action on a sub-device, sharing the request with concurrent
+    identical read actions.
+
+    :type device: Device
+    :param device_id: ID of the sub-device
+    :param action_id: ID of the action to execute
+    :param max_age: seconds old a cached read result may be, None to always
+                    read from the device
+    :returns: None or action result as a dictionary
+    """
+    req_mod = settings.device_req_mod()
+
+    if not is_read_action(device, device_id, action_id):
+        return req_mod.sub_device_action(device, device_id, action_id)
+
+    return _read(_key(device, device_id, action_id),
+                 max_age,
+                 req_mod.sub_device_action,
+                 device,
+                 device_id,
+                 action_id)
+
+
+def cached(device, device_id, action_id, max_age):
+    """
+    :type device: Device
+    :param device_id: sub-device ID, None for the device itself
+    :param action_id: action ID
+    :param max_age: seconds old the cached result may be
+    :returns: cached result of a read action if at most max_age seconds old,
+              else None
+    """
+    if not is_read_action(device, device_id, action_id):
+        return None
+
+    return _cache.get(_key(device, device_id, action_id), max_age)
+
+
+def remember(device, device_id, action_id, result, read_at=None):
+    """
+    Caches the result of a read action sent outside of this module, such as
+    in a batched device request.
+
+    :type device: Device
+    :param device_id: sub-device ID, None for the device itself
+    :param action_id: action ID
+    :param result: action result, not cached if None
+    :param read_at: monotonic time the result was read, defaults to now
+    """
+    if result is not None and is_read_action(device, device_id, action_id):
+        _cache.put(_key(device, device_id, action_id), result, read_at)
+
+
+def _key(device, device_id, action_id):
+    """
+    :returns: read cache and call key of an action
+    """
+    return (device.uuid,
+            None if device_id is None else str(device_id),
+            str(action_id))
+
+
+def _read(key, max_age, func, *args):
+    """
+    Answers a read action from the cache if fresh enough, otherwise reads
+    it from the device, shared with concurrent callers, and caches it.
+    """
+    if max_age is not None:
+        result = _cache.get(key, max_age)
+
+        if result is not None:
+            return result
+
+    return _flight.do(key, _read_device, key, func, *args)
+
+
+def _read_device(key, func, *args):
+    """
+    Reads an action result from the device and caches it if successful.
+    """
+    read_at = time.monotonic()
+    result = func(*args)
+
+    if result is not None:
+        _cache.put(key, result, read_at)
+
+    return result
+
+
+def is_read_action(device, device_id, action_id):
+    """
+    :type device: Device
+    :param device_id: sub-device ID, None for the device itself
+    :param action_id: action ID
+    :returns: True if the device's capabilities say the action returns a
+              value
+    """
+    capability = device.capability
+
+    if capability is not None and device_id is not None:
+        capability = next((sub_device for sub_device
+                           in capability.get("devices", ())
+                           if str(sub_device.get("id")) == str(device_id)),
+                          None)
+
+    if capability is None:
+        return False
+
+    for action in capability.get("actions", ()):
+        if str(action.get("id")) == str(action_id):
+            return action.get("return_type") is not None
+
+    return False
+
+
+def invalidate(uuid):
+    """
+    Drops the cached read results of a device.
+
+    :param uuid: device UUID
+    """
+    _cache.invalidate(uuid)
+
+
+def stats():
+    """
+    :returns: number of read action calls, of device requests sent for them
+              and the share of calls deduplicated
+    :rtype: dict
+    """
+    return _flight.stats()
+
+
+def cache_stats():
+    """
+    :returns: read cache hits, misses, hit rate, evictions and size
+    :rtype: dict
+    """
+    return _cache.stats()
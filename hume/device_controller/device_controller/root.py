@@ -17,8 +17,9 @@ UTIL = [
     broker, storage
 ]
 
+# Device models must be registered before the config models referring to them.
 APPLICATIONS = [
-    config, device, dispatch
+    device, config, dispatch
 ]
 
 
@@ -55,8 +56,9 @@ def stop():
     """
     LOGGER.info("root stop")
 
-    # application stop
-    for app in APPLICATIONS:
+    # application stop, in reverse so that config's timers are stopped
+    # before the device app closes the device session
+    for app in reversed(APPLICATIONS):
         app.stop()
 
     # core stop
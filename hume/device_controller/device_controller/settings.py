@@ -0,0 +1,20 @@
+from device_controller.device import device_req_lib
+
+
+"""
+This module holds settings that a test harness can override, such as the
+module used to send requests to devices. HTT replaces it with its own plugin
+to capture outgoing device traffic.
+"""
+
+
+# Module sending action requests to devices, must provide device_action and
+# sub_device_action like device_req_lib.
+_device_req_mod = device_req_lib
+
+
+def device_req_mod():
+    """
+    :returns: module used to send action requests to devices
+    """
+    return _device_req_mod
@@ -7,6 +7,26 @@ _args: dict
 
 HUME_UUID = "hume_uuid"
 
+# DEVICE SERVER PARAMETERS
+DEVICE_SERVER_MODE = "device_server_mode"
+DEVICE_SERVER_WORKERS = "device_server_workers"
+EVENT_QUEUE_SIZE = "event_queue_size"
+ATTACH_WINDOW = "attach_window"
+ATTACH_MAX_PENDING = "attach_max_pending"
+
+# DEVICE CLIENT PARAMETERS
+DEVICE_CONNECT_TIMEOUT = "device_connect_timeout"
+DEVICE_READ_TIMEOUT = "device_read_timeout"
+DEVICE_RATE_LIMITS = "device_rate_limit"
+HEARTBEAT_INTERVAL = "heartbeat_interval"
+
+# TIMER PARAMETERS
+TIMER_MISSED_POLICY = "timer_missed_policy"
+TIMER_RESTART_POLICY = "timer_restart_policy"
+TIMER_RESTART_WINDOW = "timer_restart_window"
+ACTION_CONCURRENCY = "action_concurrency"
+ACTION_QUEUE_SIZE = "action_queue_size"
+
 # TESTING PARAMETERS
 TEST_DEVICE_MOCK_ADDRESS = "test_device_mock_address"
 TEST_RUN_DEVICE_SIMULATOR = "test_run_device_simulator"
@@ -4,6 +4,24 @@ import threading
 import argparse
 
 from device_controller import root
+from device_controller.config.scheduler import POLICIES, POLICY_SKIP
+from device_controller.config.device_timer import (
+    RESTART_POLICIES,
+    RESTART_SPREAD,
+    DEFAULT_RESTART_WINDOW
+)
+from device_controller.device.action_executor import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_QUEUE_SIZE
+)
+from device_controller.device.device_queue import parse_class_limit
+from device_controller.device import attach_admission, event_pipeline
+from device_controller.device.heartbeat import DEFAULT_INTERVAL
+from device_controller.device.http_server import (
+    SERVER_MODES,
+    SERVER_MODE_SINGLE,
+    DEFAULT_SERVER_WORKERS
+)
 
 from device_controller.util.log import set_up_logging
 
@@ -29,6 +47,84 @@ def parse_args():
     # Optional arguments
     #
 
+    # Device ingress server
+    parser.add_argument('--device-server-mode',
+                        choices=SERVER_MODES,
+                        default=SERVER_MODE_SINGLE,
+                        help="How the device HTTP server handles requests, "
+                             "one at a time or concurrently in a thread pool")
+    parser.add_argument('--device-server-workers',
+                        type=int,
+                        default=DEFAULT_SERVER_WORKERS,
+                        help="Number of worker threads for the threaded "
+                             "device HTTP server")
+    parser.add_argument('--event-queue-size',
+                        type=int,
+                        default=event_pipeline.DEFAULT_QUEUE_SIZE,
+                        help="Max number of device events waiting to be "
+                             "forwarded to the HC, more are dropped")
+    parser.add_argument('--attach-window',
+                        type=float,
+                        default=attach_admission.WINDOW,
+                        help="Seconds to wait for more device attaches "
+                             "before writing them to storage together, "
+                             "threaded device server mode only")
+    parser.add_argument('--attach-max-pending',
+                        type=int,
+                        default=attach_admission.MAX_PENDING,
+                        help="Max number of device attaches waiting to be "
+                             "written, more are answered with 503")
+
+    # Device client
+    parser.add_argument('--device-connect-timeout',
+                        type=float,
+                        help="Seconds to wait for a connection to a device")
+    parser.add_argument('--device-read-timeout',
+                        type=float,
+                        help="Seconds to wait for a device to respond")
+    parser.add_argument('--device-rate-limit',
+                        type=parse_class_limit,
+                        action='append',
+                        metavar="CLASS=RATE[:BURST]",
+                        help="Requests per second, and burst size, sent to "
+                             "each device of a device type, 'default' for "
+                             "devices of other types. Can be repeated")
+    parser.add_argument('--heartbeat-interval',
+                        type=float,
+                        default=DEFAULT_INTERVAL,
+                        help="Seconds between heartbeats to a device, "
+                             "devices with traffic within the interval are "
+                             "not sent heartbeats")
+
+    # Timers
+    parser.add_argument('--timer-missed-policy',
+                        choices=POLICIES,
+                        default=POLICY_SKIP,
+                        help="When timers fall behind, skip the missed "
+                             "firings or fire them all to catch up")
+    parser.add_argument('--timer-restart-policy',
+                        choices=RESTART_POLICIES,
+                        default=RESTART_SPREAD,
+                        help="What to do about timer firings missed while "
+                             "stopped: fire them at once when resuming, skip "
+                             "them, or fire them spread over the restart "
+                             "window")
+    parser.add_argument('--timer-restart-window',
+                        type=float,
+                        default=DEFAULT_RESTART_WINDOW,
+                        help="Seconds to spread missed timer firings over "
+                             "after a restart")
+    parser.add_argument('--action-concurrency',
+                        type=int,
+                        default=DEFAULT_CONCURRENCY,
+                        help="Max number of devices sent timer and trigger "
+                             "actions at once")
+    parser.add_argument('--action-queue-size',
+                        type=int,
+                        default=DEFAULT_QUEUE_SIZE,
+                        help="Max number of queued timer and trigger action "
+                             "requests, more are dropped")
+
     # Testing arguments are prepended with "--test", or "-t" for short.
     group = parser.add_mutually_exclusive_group()
     group.add_argument('-t-dma',
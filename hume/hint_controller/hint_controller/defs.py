@@ -6,3 +6,4 @@ Definitions for the Device Controller.
 # Message types
 DISCOVER_DEVICES = 0
 CONFIRM_ATTACH = 1
+DEVICE_EVENTS = 2
@@ -28,3 +28,6 @@ def incoming_command(command):
 
     elif decoded_command["type"] == defs.CONFIRM_ATTACH:
         hint_command_lib.confirm_attach_result(decoded_command)
+
+    elif decoded_command["type"] == defs.DEVICE_EVENTS:
+        hint_command_lib.device_events(decoded_command)
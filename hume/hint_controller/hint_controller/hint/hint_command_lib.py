@@ -37,11 +37,19 @@ def init(client):
 def discover_devices_done(command):
     """
     This is just a forward of what was returned by DC since the messages look
-    exactly the same.
+    exactly the same. When DC streams discovery results, this is called once
+    per partial result and once for the final result marked as done, each is
+    forwarded as soon as it arrives.
 
     :type command: dict
     """
-    LOGGER.info("sending discover devices result to HINT")
+    if command.get("done", True):
+        LOGGER.info(f"sending discover devices result to HINT, session: "
+                    f"{command.get('session_id')}")
+    else:
+        LOGGER.debug(f"sending partial discover devices result to HINT, "
+                     f"session: {command.get('session_id')}")
+
     HintClient.command(command)
 
 
@@ -54,3 +62,14 @@ def confirm_attach_result(command):
     """
     LOGGER.info("sending confirm attach result to HINT")
     HintClient.command(command)
+
+
+def device_events(command):
+    """
+    Forwards a batch of device events from DC to HINT. DC batches events, so
+    each batch is sent as a single message.
+
+    :type command: dict
+    """
+    LOGGER.debug(f"sending {len(command['content'])} device events to HINT")
+    HintClient.command(command)
@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+import uuid
+
+
+"""
+Measures the memory held by device capability documents with and without the
+capability registry, loading devices of a number of distinct models.
+
+Run from this directory: python capability_registry.py
+"""
+
+
+def model_document(model):
+    """
+    Returns a capability document for the parameter model number, modelled on
+    the THERMO X2 example.
+    """
+    return {
+        "name": f"THERMO X{model}",
+        "description": "Combined Thermometer and Humidity sensor.",
+        "category": 0,
+        "type": 0,
+        "firmware": f"1.{model}.0",
+        "data_types": {
+            "0": "Temperature",
+            "1": "Humidity"
+        },
+        "actions": [
+            {
+                "id": action_id,
+                "name": f"Read sensor {action_id}",
+                "type": 1,
+                "return_type": 2,
+                "data_type": action_id % 2
+            } for action_id in range(8)
+        ]
+    }
+
+
+def device_payloads(num_devices, num_models):
+    """
+    Returns (uuid, JSON payload) for each device, as received over HTTP.
+    """
+    payloads = []
+
+    for i in range(num_devices):
+        device_uuid = str(uuid.uuid4())
+        document = model_document(i % num_models)
+        document["uuid"] = device_uuid
+        payloads.append((device_uuid, json.dumps(document)))
+
+    return payloads
+
+
+def measure(load):
+    """
+    :returns: bytes still allocated after calling load, and its result
+    """
+    tracemalloc.start()
+    result = load()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return current, result
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath("../../hume/device_controller"))
+    from device_controller.device import capability_registry
+
+    parser = argparse.ArgumentParser(description="Capability registry memory")
+    parser.add_argument('--devices', type=int, default=10000)
+    parser.add_argument('--models', type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = device_payloads(args.devices, args.models)
+
+    def load_plain():
+        return {device_uuid: json.loads(payload)
+                for device_uuid, payload in payloads}
+
+    def load_interned():
+        for device_uuid, payload in payloads:
+            capability_registry.register(device_uuid, json.loads(payload))
+
+    plain_bytes, documents = measure(load_plain)
+    del documents
+    interned_bytes, _ = measure(load_interned)
+
+    print(f"devices: {args.devices} models: {args.models}")
+    print(f"one document per device: {plain_bytes / 1024:10.1f} KiB")
+    print(f"interned registry:       {interned_bytes / 1024:10.1f} KiB")
+    print(f"measured saving:         "
+          f"{(plain_bytes - interned_bytes) / 1024:10.1f} KiB")
+    print(f"registry stats: {capability_registry.stats()}")
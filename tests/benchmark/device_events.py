@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+
+"""
+Benchmarks the DC device event pipeline. Producer threads, standing in for
+the device HTTP server workers, put events on the pipeline as fast as they
+can while the forwarder sends them to a fake broker taking BROKER_DELAY
+seconds per message. Forwarding one event per message is compared against
+micro-batches.
+
+The ingest rate is how fast producers got their events accepted, the forward
+rate how fast the events reached the broker.
+
+Run from this directory: python device_events.py
+"""
+
+
+BROKER_DELAY = 0.002
+
+
+def run_scenario(batch_size, producers, events_per_producer, queue_size):
+    """
+    Runs one scenario with the parameter batch size.
+
+    :return: ingest events/s, forward events/s, dropped events, batches sent
+    """
+    total = producers * events_per_producer
+
+    def send(events):
+        time.sleep(BROKER_DELAY)
+
+    pipeline = EventPipeline(send,
+                             queue_size=queue_size,
+                             batch_size=batch_size)
+    pipeline.start()
+
+    def produce(producer):
+        for event_id in range(events_per_producer):
+            pipeline.put({"uuid": f"device-{producer}",
+                          "device_id": None,
+                          "event_id": event_id,
+                          "content": {"data": 666},
+                          "timestamp": time.time()})
+
+    threads = [threading.Thread(target=produce, args=(producer,))
+               for producer in range(producers)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ingested = time.perf_counter() - start
+
+    pipeline.stop()
+    elapsed = time.perf_counter() - start
+
+    stats = pipeline.stats()
+
+    return (total / ingested,
+            stats["forwarded"] / elapsed,
+            stats["dropped"],
+            stats["batches"])
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath("../../hume/device_controller"))
+    from device_controller.device.event_pipeline import (
+        EventPipeline,
+        DEFAULT_QUEUE_SIZE
+    )
+
+    parser = argparse.ArgumentParser(description="Device event benchmark")
+    parser.add_argument('--batch-sizes',
+                        type=int,
+                        nargs='+',
+                        default=[1, 50, 500])
+    parser.add_argument('--producers', type=int, default=16)
+    parser.add_argument('--events-per-producer', type=int, default=2000)
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    print(f"{'batch':>6} {'ingest ev/s':>12} {'forward ev/s':>13} "
+          f"{'dropped':>8} {'batches':>8}")
+    for batch_size in args.batch_sizes:
+        ingest, forward, dropped, batches = run_scenario(
+            batch_size,
+            args.producers,
+            args.events_per_producer,
+            args.queue_size
+        )
+        print(f"{batch_size:>6} {ingest:>12.0f} {forward:>13.0f} "
+              f"{dropped:>8} {batches:>8}")
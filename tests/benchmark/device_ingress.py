@@ -0,0 +1,133 @@
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from bottle import Bottle
+
+
+"""
+Benchmarks the DC device ingress server modes against each other. Each
+simulated device opens a new connection per request, like a real device does,
+and posts an attach message to a handler that takes HANDLER_DELAY seconds,
+roughly the cost of a storage write.
+
+Run from this directory: python device_ingress.py
+"""
+
+
+HOST = "localhost"
+PORT = 18081
+
+HANDLER_DELAY = 0.005
+
+
+def create_app():
+    """
+    Creates a bottle app with an attach route simulating handling time.
+    """
+    app = Bottle()
+
+    @app.post('/devices/attach')
+    def attach():
+        time.sleep(HANDLER_DELAY)
+
+    return app
+
+
+def device(requests_per_device):
+    """
+    A simulated device sending attach requests.
+
+    :return: list of request latencies, number of failed requests
+    """
+    latencies = []
+    failures = 0
+    body = json.dumps({"uuid": "bench"})
+
+    for _ in range(requests_per_device):
+        start = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection(HOST, PORT, timeout=30)
+            conn.request("POST",
+                         "/devices/attach",
+                         body=body,
+                         headers={"Content-Type": "application/json"})
+            conn.getresponse().read()
+            conn.close()
+            latencies.append(time.perf_counter() - start)
+        except OSError:
+            failures += 1
+
+    return latencies, failures
+
+
+def run_scenario(mode, workers, num_devices, requests_per_device):
+    """
+    Runs one scenario against a server in the parameter mode.
+
+    :return: requests/s, p99 latency in ms, number of failed requests
+    """
+    server = create_server(HOST, PORT, mode=mode, workers=workers)
+    server_thread = threading.Thread(target=server.run, args=(create_app(),))
+    server_thread.start()
+    time.sleep(0.5)  # Let the server bind
+
+    latencies = []
+    failures = 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_devices) as executor:
+        futures = [executor.submit(device, requests_per_device)
+                   for _ in range(num_devices)]
+        for future in futures:
+            device_latencies, device_failures = future.result()
+            latencies.extend(device_latencies)
+            failures += device_failures
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server_thread.join()
+    server.srv.server_close()
+
+    if len(latencies) > 1:
+        p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+    else:
+        p99 = float("nan")
+
+    return len(latencies) / elapsed, p99, failures
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath("../../hume/device_controller"))
+    from device_controller.device.http_server import (
+        create_server,
+        SERVER_MODES,
+        DEFAULT_SERVER_WORKERS
+    )
+
+    parser = argparse.ArgumentParser(description="Device ingress benchmark")
+    parser.add_argument('--devices',
+                        type=int,
+                        nargs='+',
+                        default=[10, 100, 1000])
+    parser.add_argument('--requests-per-device', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=DEFAULT_SERVER_WORKERS)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'devices':>8} {'req/s':>10} {'p99 ms':>10} "
+          f"{'failed':>7}")
+    for num_devices in args.devices:
+        for mode in SERVER_MODES:
+            rps, p99, failed = run_scenario(mode,
+                                            args.workers,
+                                            num_devices,
+                                            args.requests_per_device)
+            print(f"{mode:>10} {num_devices:>8} {rps:>10.1f} {p99:>10.1f} "
+                  f"{failed:>7}")
@@ -0,0 +1,131 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+
+"""
+Compares driving device action timers with one threading.Timer per timer, as
+device_timer used to, against the single-threaded scheduler. Reports the
+number of threads, memory allocated and how late timers fire.
+
+Run from this directory: python device_timer.py
+"""
+
+
+class Recorder:
+    """
+    Records how late each timer fires compared to when it was due.
+    """
+
+    def __init__(self):
+        self.lateness = []
+        self.lock = threading.Lock()
+        self.active = True
+
+    def record(self, due):
+        late = time.monotonic() - due
+        with self.lock:
+            if self.active:
+                self.lateness.append(late)
+
+
+def run_thread_timers(num_timers, interval, duration, recorder):
+    """
+    One threading.Timer per timer, re-created on every timeout.
+    """
+    timers = {}
+    stopped = threading.Event()
+
+    def timeout(key, due):
+        recorder.record(due)
+        if not stopped.is_set():
+            arm(key, interval)
+
+    def arm(key, delay):
+        due = time.monotonic() + delay
+        timer = threading.Timer(delay, timeout, args=(key, due))
+        timers[key] = timer
+        timer.start()
+
+    for key in range(num_timers):
+        arm(key, random.uniform(0, interval))
+
+    time.sleep(duration)
+    threads = threading.active_count()
+    recorder.active = False
+
+    stopped.set()
+    for timer in list(timers.values()):
+        timer.cancel()
+
+    return threads
+
+
+def run_scheduler(num_timers, interval, duration, recorder):
+    """
+    All timers on one Scheduler.
+    """
+    scheduler = Scheduler(name="bench")
+    scheduler.start()
+
+    due = {}
+
+    def timeout(key):
+        recorder.record(due[key])
+        due[key] += interval
+
+    for key in range(num_timers):
+        delay = random.uniform(0, interval)
+        due[key] = time.monotonic() + delay
+        scheduler.schedule(key, delay, timeout, key, interval=interval)
+
+    time.sleep(duration)
+    threads = threading.active_count()
+    recorder.active = False
+
+    scheduler.stop()
+
+    return threads
+
+
+def report(name, run, args):
+    """
+    Runs one timer implementation and prints its figures.
+    """
+    recorder = Recorder()
+
+    tracemalloc.start()
+    threads = run(args.timers, args.interval, args.duration, recorder)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    lateness = sorted(recorder.lateness)
+    p50 = statistics.median(lateness) * 1000
+    p99 = statistics.quantiles(lateness, n=100)[98] * 1000
+
+    print(f"{name:>10} {threads:>8} {peak / 1024 / 1024:>9.1f} "
+          f"{len(lateness):>7} {p50:>8.2f} {p99:>8.2f} "
+          f"{lateness[-1] * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath("../../hume/device_controller"))
+    from device_controller.config.scheduler import Scheduler
+
+    parser = argparse.ArgumentParser(description="Device timer benchmark")
+    parser.add_argument('--timers', type=int, default=10000)
+    parser.add_argument('--interval', type=float, default=2.0)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{args.timers} timers, {args.interval}s interval, "
+          f"{args.duration}s run")
+    print(f"{'impl':>10} {'threads':>8} {'peak MiB':>9} {'fired':>7} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    report("scheduler", run_scheduler, args)
+    report("threads", run_thread_timers, args)
@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+
+"""
+Checks that timer firings of a read action within the timer's max_age are
+answered from the DC read cache instead of reaching the device. A timer with
+a max_age fires repeatedly at a fake device taking DEVICE_DELAY seconds per
+request, and the device requests are counted. Without a max_age every firing
+is a device request, with one only the firings after the cached reading has
+become too old are.
+
+Run from this directory: python read_cache.py
+"""
+
+
+DEVICE_DELAY = 0.005
+
+
+class FakeDevice:
+    """
+    Device with a read action, as Device looks to the action path.
+    """
+
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.capability = {"actions": [{"id": 1, "return_type": 2}]}
+
+
+class FakeRequests:
+    """
+    Stands in for device_req_lib, counting the requests sent to devices.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def device_action(self, _device, _action_id):
+        with self._lock:
+            self.requests += 1
+
+        time.sleep(DEVICE_DELAY)
+        return {"data": 21.5}
+
+    def sub_device_action(self, device, _device_id, action_id):
+        return self.device_action(device, action_id)
+
+
+def run_scenario(max_age, firings, interval):
+    """
+    Fires a timer's action the parameter number of times.
+
+    :return: number of device requests, number of results
+    """
+    requests = FakeRequests()
+    settings._device_req_mod = requests
+
+    device = FakeDevice(f"device-{max_age}")
+    results = []
+    done = threading.Semaphore(0)
+
+    def on_result(result):
+        results.append(result)
+        done.release()
+
+    scheduler = Scheduler()
+    executor = ActionExecutor()
+    batcher = ActionBatcher(scheduler, executor, window=0.001)
+    scheduler.start()
+    executor.start()
+
+    for _ in range(firings):
+        batcher.submit(device, None, 1, on_result, max_age=max_age)
+        done.acquire()
+        time.sleep(interval)
+
+    scheduler.stop()
+    executor.stop()
+
+    return requests.requests, len([result for result in results if result])
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath("../../hume/device_controller"))
+    from device_controller import settings
+    from device_controller.config.scheduler import Scheduler
+    from device_controller.device.action_batcher import ActionBatcher
+    from device_controller.device.action_executor import ActionExecutor
+
+    parser = argparse.ArgumentParser(description="Read cache check")
+    parser.add_argument('--firings', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--max-age', type=float, default=0.5)
+    args = parser.parse_args()
+
+    uncached, _ = run_scenario(None, args.firings, args.interval)
+    cached, answered = run_scenario(args.max_age, args.firings, args.interval)
+
+    print(f"{args.firings} firings every {args.interval}s: {uncached} device "
+          f"requests without max_age, {cached} with max_age {args.max_age}s")
+
+    # Every firing is answered, and firings within max_age of the last
+    # device read do not reach the device
+    expected = int(args.firings * args.interval // args.max_age) + 1
+    assert answered == args.firings, f"{answered} firings answered"
+    assert uncached == args.firings, f"{uncached} requests without max_age"
+    assert cached <= expected, f"{cached} requests, expected {expected}"
+
+    print("OK")
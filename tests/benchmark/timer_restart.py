@@ -0,0 +1,95 @@
+import argparse
+import os
+import random
+import sys
+import time
+import types
+import uuid
+
+
+"""
+Measures the timer load spike after a restart with many timers, for each
+timer restart policy. Timers are restored from persisted next fire times as
+if the device controller had been stopped for a while, and the number of
+firings due in each second after the restart is read from the scheduler.
+
+"from zero" is how timers were started before fire times were persisted,
+each re-armed a full interval after the restart, and "new" is timers without
+persisted fire times with spread phases.
+
+Run from this directory: python timer_restart.py
+"""
+
+
+INTERVALS = (30, 60, 300)
+
+
+def make_timers(num_timers, downtime, now):
+    """
+    :returns: timers as persisted downtime seconds ago, with random phases
+    """
+    timers = []
+
+    for timer_id in range(num_timers):
+        interval = random.choice(INTERVALS)
+        stopped_at = now - downtime
+        timers.append(types.SimpleNamespace(
+            id=timer_id,
+            action=f"{uuid.uuid4()},{random.randint(0, 9)}",
+            interval=interval,
+            next_fire=stopped_at + random.uniform(0, interval),
+            # Fixed interval timers
+            adaptive=False,
+            min_interval=None,
+            max_interval=None,
+            deadband=None,
+            max_age=None
+        ))
+
+    return timers
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath("../../hume/device_controller"))
+    from device_controller.config import device_timer
+    from device_controller.config.scheduler import Scheduler
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--timers", type=int, default=5000)
+    parser.add_argument("--downtime", type=float, default=600.0,
+                        help="seconds the timers were stopped")
+    parser.add_argument("--window", type=int, default=120,
+                        help="seconds after the restart to look at")
+    args = parser.parse_args()
+
+    now = time.time()
+    timers = make_timers(args.timers, args.downtime, now)
+
+    print(f"{args.timers} timers restarted after {args.downtime:.0f}s, "
+          f"firings per second over the first {args.window}s")
+    print(f"{'policy':>10} {'peak':>6} {'first 10s':>10} {'catch-ups':>10}")
+
+    runs = (
+        ("from zero", None, False, False),
+        ("new", None, True, False),
+        (device_timer.RESTART_RESUME, device_timer.RESTART_RESUME, True, True),
+        (device_timer.RESTART_SKIP, device_timer.RESTART_SKIP, True, True),
+        (device_timer.RESTART_SPREAD, device_timer.RESTART_SPREAD, True, True),
+    )
+
+    for name, policy, spread_phases, persisted in runs:
+        # Scheduler is not started, only its heap is inspected
+        device_timer._scheduler = Scheduler(name=name)
+        device_timer.configure(spread_phases=spread_phases,
+                               restart_policy=policy)
+
+        restored = [types.SimpleNamespace(
+            **dict(vars(timer), next_fire=timer.next_fire if persisted
+                   else None)
+        ) for timer in timers]
+
+        catch_ups = device_timer.restore(restored, now)
+        histogram = device_timer.load_histogram(args.window)
+
+        print(f"{name:>10} {max(histogram):6d} {sum(histogram[:10]):10d} "
+              f"{catch_ups:10d}")
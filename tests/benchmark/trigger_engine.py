@@ -0,0 +1,94 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+
+"""
+Measures event-to-action latency of the trigger engine with many triggers
+loaded: the time from an event arriving until its triggered actions are
+handed on for execution. Compares the indexed engine against scanning a list
+of all triggers for each event.
+
+Action execution is replaced by recording the hand-off time, so only the
+matching is measured, not the device requests.
+
+Run from this directory: python trigger_engine.py
+"""
+
+
+def make_rules(num_rules, num_devices):
+    """
+    :returns: [(event, action path string)] spread over num_devices devices
+              with a few sub-devices and events each
+    """
+    devices = [str(uuid.uuid4()) for _ in range(num_devices)]
+    rules = set()
+
+    while len(rules) < num_rules:
+        event = (random.choice(devices),
+                 random.choice((None, 1, 2, 3)),
+                 random.randint(0, 9))
+        action = f"{random.choice(devices)},{random.randint(0, 9)}"
+        rules.add((event, action))
+
+    return list(rules)
+
+
+def percentiles(samples):
+    """
+    :returns: median, p99 and max of samples in microseconds
+    """
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    return (statistics.median(samples) * 1e6,
+            p99 * 1e6,
+            samples[-1] * 1e6)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath("../../hume/device_controller"))
+    from device_controller.config import action_path, trigger_engine
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules, args.devices)
+    events = [random.choice(rules)[0] for _ in range(args.events)]
+
+    handed_off = []
+    trigger_engine.device_timer.execute = \
+        lambda path: handed_off.append(time.perf_counter())
+
+    # Indexed engine
+    for trigger_id, (event, action) in enumerate(rules):
+        trigger_engine._index.add(trigger_id, event, action_path.parse(action))
+
+    # List of all triggers, scanned for each event
+    rule_list = [(event, action_path.parse(action)) for event, action in rules]
+
+    def scan(uuid_, device_id, event_id):
+        for event, path in rule_list:
+            if event == (uuid_, device_id, event_id):
+                trigger_engine.device_timer.execute(path)
+
+    print(f"{args.rules} triggers, {args.events} events")
+    print(f"{'engine':>8} {'median':>10} {'p99':>10} {'max':>10}  (us)")
+
+    for name, handle in (("scan", scan), ("indexed", trigger_engine.event)):
+        latencies = []
+
+        for event in events:
+            handed_off.clear()
+            start = time.perf_counter()
+            handle(*event)
+            latencies.extend(end - start for end in handed_off)
+
+        print(f"{name:>8} " +
+              " ".join(f"{value:10.1f}" for value in percentiles(latencies)))
@@ -3,7 +3,7 @@ import random
 import threading
 
 from monitoring import monitor
-from traffic_generator.simulator import Device
+from traffic_generator.simulator import Device, attach_storm
 
 from traffic_generator.supervision import dc_supervisor, hc_supervisor
 from traffic_generator.simulator.device_sim import DeviceSim
@@ -59,6 +59,9 @@ def start():
     # TODO load HTT configuration
     htt_specs = load_htt_specs()
 
+    if htt_specs.attach_storm:
+        run_attach_storm(htt_specs)
+
     # TODO start running traffic based on specs
     run_traffic(device_specs, htt_specs)
 
@@ -85,6 +88,23 @@ def stop():
     print("All supervised processes and threads have been joined")
 
 
+def run_attach_storm(htt_specs):
+    """
+    Attaches many devices to the DC at once and reports the time until all
+    were attached to the monitor.
+
+    :param htt_specs:
+    """
+    _monitor_t, monitor_q = supervision_info.get("monitor")
+
+    print(f"HTT attach storm of {htt_specs.attach_storm} devices")
+
+    report = attach_storm.run(htt_specs.attach_storm,
+                              batch_size=htt_specs.attach_storm_batch_size)
+
+    monitor_q.put((None, attach_storm.report_str(report)))
+
+
 def run_traffic(device_specs, htt_specs):
     """
     Start traffic.
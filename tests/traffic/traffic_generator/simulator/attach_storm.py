@@ -0,0 +1,174 @@
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+"""
+Reproduces an attach storm, every device attaching at once as after a power
+cut, against a running DC device server. Each simulated device posts its
+attach message on a new connection like a real device, and when refused with
+503 retries after the Retry-After the DC answered with. Other refusals, such
+as a batch larger than the DC admits at once, are not retried. A device is
+attached once its attach has been answered with 200, the DC then has it
+saved.
+
+With a batch size, devices are instead attached in groups through the batch
+attach endpoint, as a gateway attaching the devices behind it would.
+
+Run from tests/traffic: python -m traffic_generator.simulator.attach_storm
+"""
+
+
+HOST = "localhost"
+PORT = 8081
+
+# Seconds to give up on a device that has not attached.
+DEADLINE = 120.0
+# Seconds to wait before retrying after a connection error.
+ERROR_BACKOFF = 1.0
+
+
+def attach(path, body, deadline, retry_scale=1.0):
+    """
+    Posts an attach message until it is accepted, honouring Retry-After.
+
+    :param path: attach endpoint
+    :param body: attach message
+    :type body: dict
+    :param deadline: monotonic time to give up at
+    :param retry_scale: factor applied to Retry-After, to speed up test runs
+    :return: monotonic time of the accepted attach or None if given up,
+             number of refusals, number of connection errors
+    """
+    refusals = 0
+    errors = 0
+    encoded = json.dumps(body)
+
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(HOST, PORT, timeout=30)
+            conn.request("POST",
+                         path,
+                         body=encoded,
+                         headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+        except OSError:
+            errors += 1
+            time.sleep(ERROR_BACKOFF)
+            continue
+
+        if response.status == 200:
+            return time.monotonic(), refusals, errors
+
+        if response.status != 503:
+            # Rejected, such as a batch too large, retrying would not help
+            break
+
+        refusals += 1
+        retry_after = float(response.getheader("Retry-After") or 1)
+        time.sleep(retry_after * retry_scale)
+
+    return None, refusals, errors
+
+
+def run(num_devices, batch_size=0, retry_scale=1.0, deadline=DEADLINE):
+    """
+    Runs an attach storm of the parameter number of devices.
+
+    :param num_devices: number of devices attaching at once
+    :param batch_size: devices per batch attach, 0 for single attaches
+    :param retry_scale: factor applied to Retry-After
+    :param deadline: seconds to give up on devices that have not attached
+    :return: storm report
+    :rtype: dict
+    """
+    uuids = [str(uuid.uuid4()) for _ in range(num_devices)]
+
+    if batch_size:
+        requests = [("/devices/attach/batch",
+                     {"devices": [{"uuid": device_uuid}
+                                  for device_uuid in uuids[i:i + batch_size]]})
+                    for i in range(0, num_devices, batch_size)]
+    else:
+        requests = [("/devices/attach", {"uuid": device_uuid})
+                    for device_uuid in uuids]
+
+    # Hold every device back until all are ready, then attach at once
+    ready = threading.Barrier(len(requests))
+
+    def device(path, body):
+        ready.wait()
+        return attach(path, body, give_up_at, retry_scale)
+
+    start = time.monotonic()
+    give_up_at = start + deadline
+
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        futures = [(executor.submit(device, path, body),
+                    len(body.get("devices", [body])))
+                   for path, body in requests]
+        results = [(future.result(), devices) for future, devices in futures]
+
+    attach_times = []
+    refusals = 0
+    errors = 0
+    failed = 0
+
+    for (attached_at, request_refusals, request_errors), devices in results:
+        refusals += request_refusals
+        errors += request_errors
+
+        if attached_at is None:
+            failed += devices
+        else:
+            attach_times.extend([attached_at - start] * devices)
+
+    return {
+        "devices": num_devices,
+        "attached": len(attach_times),
+        "failed": failed,
+        "refusals": refusals,
+        "errors": errors,
+        # Time until every device that attached had attached
+        "time_to_attached": max(attach_times) if attach_times else None,
+        "p50": statistics.median(attach_times) if attach_times else None,
+        "p99": (statistics.quantiles(attach_times, n=100)[98]
+                if len(attach_times) > 1 else None)
+    }
+
+
+def report_str(report):
+    """
+    :param report: storm report from run
+    :return: one line summary of the report
+    """
+    def seconds(value):
+        return "n/a" if value is None else f"{value:.2f}s"
+
+    return (f"attach storm: {report['attached']}/{report['devices']} devices "
+            f"attached in {seconds(report['time_to_attached'])}, p50 "
+            f"{seconds(report['p50'])}, p99 {seconds(report['p99'])}, "
+            f"{report['refusals']} refusals, {report['errors']} connection "
+            f"errors, {report['failed']} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DC attach storm")
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=0)
+    parser.add_argument('--retry-scale', type=float, default=1.0)
+    parser.add_argument('--deadline', type=float, default=DEADLINE)
+    args = parser.parse_args()
+
+    print(report_str(run(args.devices,
+                         batch_size=args.batch_size,
+                         retry_scale=args.retry_scale,
+                         deadline=args.deadline)))
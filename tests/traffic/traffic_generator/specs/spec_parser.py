@@ -43,6 +43,12 @@ class HTTSettings:
         """
         self.chaos_element = htt_settings.get("chaos_element", False)
         self.actions_per_minute = htt_settings.get("actions_per_minute", 1.0)
+        # Number of devices attaching at once before traffic starts, 0 for
+        # no attach storm
+        self.attach_storm = htt_settings.get("attach_storm", 0)
+        self.attach_storm_batch_size = htt_settings.get(
+            "attach_storm_batch_size", 0
+        )
 
 
 def load_htt_specs():
@@ -1,5 +1,7 @@
 import logging
 import os
+import threading
+import time
 import traceback
 
 import sys
@@ -11,6 +13,10 @@ from traffic_generator.specs.spec_parser import get_device_spec
 from traffic_generator.supervision import device_req_plugin
 
 
+# Seconds between DC metric reports to the monitor.
+REPORT_INTERVAL = 10.0
+
+
 def start_dc(monitor_queue: multiprocessing.Queue):
     """
     Starts the device_controller in a separate process which can be communicated
@@ -78,6 +84,41 @@ def set_up_logging():
     logger.addHandler(handler)
 
 
+def start_reporting(monitor_queue: multiprocessing.Queue):
+    """
+    Periodically reports DC metrics to the monitor application.
+
+    :param monitor_queue: reporting queue of the monitor application
+    """
+    from device_controller.device import attach_admission, single_flight
+
+    def report_loop():
+        while True:
+            time.sleep(REPORT_INTERVAL)
+
+            stats = single_flight.stats()
+            monitor_queue.put(
+                (None, f"DC single-flight reads: {stats['calls']} calls, "
+                       f"{stats['executions']} device requests, dedupe "
+                       f"ratio: {stats['dedupe_ratio']:.2f}")
+            )
+
+            stats = single_flight.cache_stats()
+            monitor_queue.put(
+                (None, f"DC read cache: {stats['size']} results, hit rate: "
+                       f"{stats['hit_rate']:.2f}")
+            )
+
+            stats = attach_admission.stats()
+            monitor_queue.put(
+                (None, f"DC attaches: {stats['written']} written in "
+                       f"{stats['writes']} writes, {stats['refused']} "
+                       f"refused")
+            )
+
+    threading.Thread(target=report_loop, daemon=True).start()
+
+
 def dc_loop(q: multiprocessing.Queue, monitor_queue: multiprocessing.Queue):
     """
     Main loop of the dc supervising process.
@@ -103,6 +144,8 @@ def dc_loop(q: multiprocessing.Queue, monitor_queue: multiprocessing.Queue):
     # Test start method does not block.
     start()
 
+    start_reporting(monitor_queue)
+
     # From this point on, HTT can communicate with this supervising process to
     # issue commands to the DC, for instance: device originated events. For
     # downlink messaging, HTT will receive a call in the device_req_plugin
@@ -130,7 +173,7 @@ def dc_loop(q: multiprocessing.Queue, monitor_queue: multiprocessing.Queue):
 
             if operation_tag == Device.ATTACH:
                 device_spec = get_device_spec(device)
-                device_spec["device_ip"] = f"192.168.0.{device.htt_id}"
+                device_spec["ip_address"] = f"192.168.0.{device.htt_id}"
 
                 device_req_handler.attach(device_spec)
 